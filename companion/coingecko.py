@@ -12,3 +12,13 @@ def get_rate(ids, vs_currencies):
     r.raise_for_status()
     logger.debug(r.json())
     return r.json()[ids.lower()][vs_currencies.lower()]
+
+
+def get_rate_range(ids, vs_currencies, from_timestamp, to_timestamp):
+    logger.debug(f'getting {ids} prices in {vs_currencies} from {from_timestamp} to {to_timestamp} on coingecko')
+    url = (f'https://api.coingecko.com/api/v3/coins/{ids.lower()}/market_chart/range'
+           f'?vs_currency={vs_currencies.lower()}&from={int(from_timestamp)}&to={int(to_timestamp)}')
+    r = requests.get(url)
+    r.raise_for_status()
+    # timestamps are returned in milliseconds
+    return [(int(timestamp / 1000), price) for timestamp, price in r.json()['prices']]
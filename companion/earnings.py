@@ -0,0 +1,69 @@
+from collections import deque
+
+SAMPLES_SIZE = 288
+
+
+class EarningsEstimator:
+    """Earnings rate of a miner fitted on its balance samples
+
+    The balance is a sawtooth reset by each payout. A least squares line is fitted on the samples since the last payout
+    from running sums, so a new sample never rescans the history.
+    """
+
+    def __init__(self, samples=None, origin=None, count=0, sum_t=0, sum_b=0, sum_tt=0, sum_tb=0, rate=None,
+                 payout_eta=None):
+        # compact series of (timestamp, balance), oldest first
+        self.samples = deque(samples or [], maxlen=SAMPLES_SIZE)
+        self.origin = origin
+        self.count = count
+        self.sum_t = sum_t
+        self.sum_b = sum_b
+        self.sum_tt = sum_tt
+        self.sum_tb = sum_tb
+        # weis per second
+        self.rate = rate
+        self.payout_eta = payout_eta
+
+    def _reset(self, timestamp):
+        self.origin = timestamp
+        self.count = 0
+        self.sum_t = self.sum_b = self.sum_tt = self.sum_tb = 0
+
+    def add(self, timestamp, balance):
+        if self.samples:
+            last_timestamp, last_balance = self.samples[-1]
+            if timestamp <= last_timestamp:
+                return
+            if balance < last_balance:
+                # payout happened, keep the previous rate until the new segment has enough samples
+                self._reset(timestamp)
+        if self.origin is None:
+            self._reset(timestamp)
+        self.samples.append((timestamp, balance))
+        # relative timestamps keep the sums small
+        t = timestamp - self.origin
+        self.count += 1
+        self.sum_t += t
+        self.sum_b += balance
+        self.sum_tt += t * t
+        self.sum_tb += t * balance
+        denominator = self.count * self.sum_tt - self.sum_t ** 2
+        if self.count >= 2 and denominator > 0:
+            slope = (self.count * self.sum_tb - self.sum_t * self.sum_b) / denominator
+            if slope > 0:
+                self.rate = slope
+
+    def estimate(self, balance, payout_threshold, now):
+        """Estimate the timestamp of the next payout
+
+        Once the threshold is reached, the estimate is the time it was reached and stays in the past until the payout.
+        """
+        self.payout_eta = None
+        if self.rate:
+            self.payout_eta = now + (payout_threshold - balance) / self.rate
+        return self.payout_eta
+
+    def to_dict(self):
+        return {'samples': list(self.samples), 'origin': self.origin, 'count': self.count, 'sum_t': self.sum_t,
+                'sum_b': self.sum_b, 'sum_tt': self.sum_tt, 'sum_tb': self.sum_tb, 'rate': self.rate,
+                'payout_eta': self.payout_eta}
@@ -1,16 +1,31 @@
 #!/usr/bin/env python3
 import argparse
 import logging
+import multiprocessing
+import time
+from collections import Counter
 
 from coingecko import get_rate
 from config import read_config, validate_config
+from outbox import Outbox
+from profiling import CycleProfiler
+from rates import RateCache
 from requests.exceptions import HTTPError
+from rules import RuleEngine
+from scheduler import next_delay
+from sharding import HashRing, merge_metrics, shard_filename, shard_filenames
 from state import State
+from timeseries import TimeSeriesStore
 
 logger = logging.getLogger(__name__)
 
 
 DEFAULT_STATE_FILE = 'state.json'
+DEFAULT_RATES_FILE = 'rates.json'
+DEFAULT_OUTBOX_FILE = 'outbox.jsonl'
+# state keys of a miner and their State.write argument
+MINER_STATE_ARGUMENTS = {'balance': 'miner_balance', 'payment': 'miner_payment', 'earnings': 'miner_earnings',
+                         'workers': 'miner_workers'}
 
 
 def parse_arguments():
@@ -23,7 +38,30 @@ def parse_arguments():
     parser.add_argument('-N', '--disable-notifications', dest='disable_notifications', action='store_true',
                         help='do not send notifications')
     parser.add_argument('-c', '--config', help='configuration file name', default='config.json')
+    parser.add_argument('-i', '--interval', type=int,
+                        help='run forever and wait this number of seconds between cycles (polled more often around '
+                             'the estimated payout)')
+    parser.add_argument('--profile', dest='profile_file', help='write a cpu profile of the cycle to this file')
+    parser.add_argument('--profile-memory', dest='profile_memory_file',
+                        help='write top memory allocations of the cycle to this file')
+    parser.add_argument('--profile-every', dest='profile_every', type=int, default=1,
+                        help='profile one cycle out of this number of cycles, each report replaces the previous one')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='split miners across this number of processes or instances')
+    parser.add_argument('--shard-index', dest='shard_index', type=int,
+                        help='run only this shard (from 0), to split miners across independent instances')
     args = parser.parse_args()
+    if args.interval is not None and args.interval < 1:
+        parser.error('interval must be a positive number of seconds')
+    if args.shards < 1:
+        parser.error('shards must be a positive number')
+    if args.profile_every < 1:
+        parser.error('profile every must be a positive number of cycles')
+    if args.shard_index is not None and not 0 <= args.shard_index < args.shards:
+        parser.error(f'shard index must be between 0 and {args.shards - 1}')
+    if args.shards > 1 and args.shard_index is None and (args.profile_file or args.profile_memory_file):
+        # shards run in other processes than the profiler
+        parser.error('profiling shards running in parallel is not supported, profile one shard with --shard-index')
     return args
 
 
@@ -32,22 +70,86 @@ def setup_logging(args):
     logging.basicConfig(format=log_format, level=args.loglevel, filename=args.logfile)
 
 
-def main():
-    args = parse_arguments()
-    setup_logging(args)
+def get_miners(config):
+    miners = list(config.get('miners', []))
+    if config.get('miner') and config['miner'] not in miners:
+        miners.insert(0, config['miner'])
+    return miners
 
-    config = read_config(args.config)
-    validate_config(config)
 
-    state = State(filename=config.get('state_file', DEFAULT_STATE_FILE))
+def move_miner_states(config, shard_indexes, shards=1):
+    """Move the state of miners to the file of their shard, after the number of shards has changed"""
+    filename = config.get('state_file', DEFAULT_STATE_FILE)
+    ring = HashRing(shards=shards)
+    # each file is read once and saved once when it has changed
+    states = {state_filename: State(filename=state_filename) for state_filename in shard_filenames(filename)}
+    changed_states = set()
+    for shard_index in shard_indexes:
+        state_filename = shard_filename(filename, shard_index, shards)
+        if state_filename not in states:
+            states[state_filename] = State(filename=state_filename)
+        state = states[state_filename]
+        other_states = [other_state for other_filename, other_state in states.items()
+                        if other_filename != state_filename]
+        for pool in config.get('pools', []):
+            miners_state = state.get(pool).get('miners', {})
+            for address in get_miners(config):
+                if ring.get_shard(address) != shard_index or address in miners_state:
+                    continue
+                miner_state = None
+                for other_state in other_states:
+                    # remove all copies to never use a stale state if the miner comes back to another shard
+                    other_miner_state = other_state.pop_miner(pool_name=pool, address=address, save=False)
+                    if other_miner_state is None:
+                        continue
+                    changed_states.add(other_state.filename)
+                    if miner_state is None:
+                        logger.info(f'moving {pool} miner {address} state from {other_state.filename}')
+                        miner_state = other_miner_state
+                if miner_state is None and address == config.get('miner') and state_filename != filename \
+                        and filename in states:
+                    # state written before multiple miners support
+                    pool_state = states[filename].get(pool)
+                    miner_state = {'balance': pool_state.get('balance'), 'payment': pool_state.get('payment'),
+                                   'earnings': pool_state.get('earnings', {}).get(address),
+                                   'workers': pool_state.get('workers')}
+                    miner_state = {key: value for key, value in miner_state.items() if value is not None}
+                if miner_state:
+                    state.write(pool_name=pool, address=address, save=False,
+                                **{MINER_STATE_ARGUMENTS[key]: value for key, value in miner_state.items()
+                                   if key in MINER_STATE_ARGUMENTS})
+                    changed_states.add(state_filename)
+    for state_filename in changed_states:
+        logger.debug(f'saving moved miner states to {state_filename}')
+        states[state_filename].save()
 
+
+def move_orphaned_outboxes(config, shards=1):
+    """Move pending notifications of shards that no longer exist to the outbox of the first shard"""
+    filename = config.get('outbox_file', DEFAULT_OUTBOX_FILE)
+    shard_outboxes = [shard_filename(filename, shard_index, shards) for shard_index in range(shards)]
+    orphaned_outboxes = [outbox_filename for outbox_filename in shard_filenames(filename)
+                         if outbox_filename not in shard_outboxes]
+    if not orphaned_outboxes:
+        return
+    outbox = Outbox(filename=filename)
+    for outbox_filename in orphaned_outboxes:
+        count = outbox.merge(outbox_filename)
+        logger.info(f'{count} pending notification(s) moved from {outbox_filename}')
+
+
+def run(config, state, notifier=None, outbox=None, timeseries=None, rules=None, shard_index=0, shards=1):
+    """Watch all pools once for the miners of this shard and return metrics of the cycle"""
+    started = time.monotonic()
     exchange_rate = None
+    rates = None
     currency = config.get('currency')
-
-    notifier = None
-    if config.get('telegram') and not args.disable_notifications:
-        from telegram import TelegramNotifier
-        notifier = TelegramNotifier(**config['telegram'])
+    payout_etas = []
+    ring = HashRing(shards=shards)
+    miners = [address for address in get_miners(config) if ring.get_shard(address) == shard_index]
+    logger.debug(f'shard {shard_index} watching {len(miners)} miner(s)')
+    if rules:
+        rules.reset_counters()
 
     if currency:
         logger.debug('fetching current rate')
@@ -56,35 +158,164 @@ def main():
         except HTTPError as err:
             logger.warning(f'failed to get ETH/{currency} rate')
             logger.debug(str(err))
+        rates = RateCache(filename=shard_filename(config.get('rates_file', DEFAULT_RATES_FILE), shard_index, shards),
+                          ids='ethereum', vs_currencies=currency)
 
     for pool in config.get('pools', []):
         pool_state = state.get(pool)
+        miners_state = pool_state.get('miners', {})
+        # earnings were saved by pool before multiple miners support
+        earnings = dict(pool_state.get('earnings', {}))
+        earnings.update({address: miner_state['earnings'] for address, miner_state in miners_state.items()
+                         if 'earnings' in miner_state})
 
         if pool == 'flexpool':
             from pools.flexpool import FlexpoolHandler
-            handler = FlexpoolHandler(exchange_rate=exchange_rate, currency=currency, notifier=notifier)
+            handler = FlexpoolHandler(exchange_rate=exchange_rate, currency=currency, notifier=notifier, rates=rates,
+                                      block_statistics=pool_state.get('block_statistics'), earnings=earnings,
+                                      min_worker_hashrate=config.get('workers', {}).get('min_hashrate'),
+                                      outbox=outbox, timeseries=timeseries, rules=rules)
         elif pool == 'ethermine':
             from pools.ethermine import EthermineHandler
-            handler = EthermineHandler(exchange_rate=exchange_rate, currency=currency, notifier=notifier)
+            handler = EthermineHandler(exchange_rate=exchange_rate, currency=currency, notifier=notifier,
+                                       rates=rates, block_statistics=pool_state.get('block_statistics'),
+                                       earnings=earnings,
+                                       min_worker_hashrate=config.get('workers', {}).get('min_hashrate'),
+                                       outbox=outbox, timeseries=timeseries, rules=rules)
         else:
             logger.warning(f'pool {pool} not supported')
             continue
 
-        last_block = handler.watch_blocks(last_block=pool_state.get('block'))
-        if last_block:
-            logger.debug(f'saving {pool} block to state file')
-            state.write(pool_name=pool, block_number=last_block)
+        # pool blocks are the same for all shards
+        if shard_index == 0:
+            last_block = handler.watch_blocks(last_block=pool_state.get('block'))
+            if last_block:
+                logger.debug(f'saving {pool} block to state file')
+                state.write(pool_name=pool, block_number=last_block,
+                            block_statistics=handler.block_statistics.to_dict(), save=False)
+
+        for address in miners:
+            miner_state = miners_state.get(address)
+            if miner_state is None and address == config.get('miner'):
+                # state written before multiple miners support
+                miner_state = pool_state
+            miner_state = miner_state or {}
 
-        if config.get('miner'):
-            last_balance, last_transaction = handler.watch_miner(address=config['miner'],
-                                                                 last_balance=pool_state.get('balance'),
-                                                                 last_transaction=pool_state.get('payment'))
+            last_balance, last_transaction = handler.watch_miner(address=address,
+                                                                 last_balance=miner_state.get('balance'),
+                                                                 last_transaction=miner_state.get('payment'))
             if last_balance is not None:
                 logger.debug(f'saving {pool} miner balance to state file')
-                state.write(pool_name=pool, miner_balance=last_balance)
+                estimator = handler.earnings.get(address)
+                state.write(pool_name=pool, address=address, miner_balance=last_balance,
+                            miner_earnings=estimator.to_dict() if estimator else None, save=False)
             if last_transaction:
                 logger.debug(f'saving {pool} miner payment to state file')
-                state.write(pool_name=pool, miner_payment=last_transaction)
+                state.write(pool_name=pool, address=address, miner_payment=last_transaction, save=False)
+            if 'workers' in config:
+                last_workers = handler.watch_workers(address=address, last_workers=miner_state.get('workers'))
+                if last_workers is not None:
+                    logger.debug(f'saving {pool} miner workers to state file')
+                    state.write(pool_name=pool, address=address, miner_workers=last_workers, save=False)
+            estimator = handler.earnings.get(address)
+            if estimator and estimator.payout_eta:
+                payout_etas.append(estimator.payout_eta)
+
+        # written once per pool, the file holds the state of all miners
+        logger.debug(f'saving {pool} state file')
+        state.save()
+
+    notifications = 0
+    if outbox:
+        logger.debug('delivering notifications')
+        notifications = outbox.deliver(notifier)
+
+    return {'miners': len(miners), 'notifications': notifications, 'duration': time.monotonic() - started,
+            'payout_etas': payout_etas, 'rules': rules.counters() if rules else {}}
+
+
+def run_shard(config, shard_index=0, shards=1, disable_notifications=False, rules=None):
+    """Run one cycle of a shard with its own state files"""
+    state = State(filename=shard_filename(config.get('state_file', DEFAULT_STATE_FILE), shard_index, shards))
+
+    notifier = None
+    outbox = None
+    if config.get('telegram') and not disable_notifications:
+        from telegram import TelegramNotifier
+        notifier = TelegramNotifier(**config['telegram'])
+        outbox = Outbox(filename=shard_filename(config.get('outbox_file', DEFAULT_OUTBOX_FILE), shard_index, shards))
+
+    # series files are split by miner address and pool blocks are watched by the first shard only
+    timeseries = None
+    if config.get('timeseries_directory'):
+        timeseries = TimeSeriesStore(directory=config['timeseries_directory'])
+
+    try:
+        return run(config=config, state=state, notifier=notifier, outbox=outbox, timeseries=timeseries, rules=rules,
+                   shard_index=shard_index, shards=shards)
+    finally:
+        if timeseries:
+            timeseries.close()
+
+
+def main():
+    args = parse_arguments()
+    setup_logging(args)
+
+    config = read_config(args.config)
+    validate_config(config)
+
+    # compiled once, evaluated against each event
+    rules = RuleEngine(config['rules']) if config.get('rules') else None
+    rule_matches = Counter()
+
+    workers = None
+    shard_indexes = [args.shard_index or 0]
+    if args.shards > 1 and args.shard_index is None:
+        # run all shards in parallel
+        workers = multiprocessing.Pool(processes=args.shards, initializer=setup_logging, initargs=(args,))
+        shard_indexes = range(args.shards)
+
+    move_miner_states(config=config, shard_indexes=shard_indexes, shards=args.shards)
+    if 0 in shard_indexes:
+        move_orphaned_outboxes(config=config, shards=args.shards)
+
+    profiler = CycleProfiler(cpu_file=args.profile_file, memory_file=args.profile_memory_file,
+                             every=args.profile_every)
+
+    while True:
+        try:
+            with profiler.profile():
+                shard_arguments = [(config, shard_index, args.shards, args.disable_notifications, rules)
+                                   for shard_index in shard_indexes]
+                if workers:
+                    metrics = merge_metrics(workers.starmap(run_shard, shard_arguments))
+                else:
+                    metrics = merge_metrics([run_shard(*arguments) for arguments in shard_arguments])
+        except Exception as err:
+            if not args.interval:
+                raise
+            # a transient network error must not stop the daemon
+            logger.error('cycle failed')
+            logger.exception(err)
+            logger.debug(f'waiting {args.interval} seconds before next cycle')
+            time.sleep(args.interval)
+            continue
+        logger.info(f'{metrics["miners"]} miner(s) watched by {metrics["shards"]} shard(s) in '
+                    f'{metrics["duration"]:.2f}s, {metrics["notifications"]} notification(s) sent')
+        if rules:
+            rule_matches.update(metrics['rules'])
+            matches = ', '.join([f'"{name}"={count}' for name, count in rule_matches.most_common()])
+            logger.info(f'rule matches: {matches}')
+        if not args.interval:
+            break
+        delay = next_delay(interval=args.interval, payout_etas=metrics['payout_etas'])
+        logger.debug(f'waiting {int(delay)} seconds before next cycle')
+        time.sleep(delay)
+
+    if workers:
+        workers.close()
+        workers.join()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# keys of delivered notifications remembered to avoid duplicates
+DELIVERED_KEYS_SIZE = 1000
+# rewrite the file when it holds more records than this (and twice the useful records)
+COMPACTION_SIZE = 1000
+# drop a notification after this number of failed deliveries
+MAX_ATTEMPTS = 10
+
+
+class Outbox:
+    """Append-only file of notifications delivered at least once
+
+    Each notification is written to disk before the state advances, then removed by a delivery record once sent.
+    Notifications are identified by a key to never send twice the same event. A notification failing to be sent is
+    retried on the next cycle while the next ones are still delivered.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pending = OrderedDict()
+        self.delivered = OrderedDict()
+        self.attempts = {}
+        self.records = 0
+        self.read()
+
+    def read(self):
+        if not os.path.isfile(self.filename):
+            return
+        self._truncate_partial_record()
+        with open(self.filename, 'r') as fd:
+            for line in fd:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # partial line written during a crash
+                    logger.warning('ignoring corrupted outbox record')
+                    continue
+                self.records += 1
+                self._apply(record)
+
+    def _truncate_partial_record(self):
+        """Remove the end of a record written during a crash, otherwise the next record would be appended to it"""
+        with open(self.filename, 'rb+') as fd:
+            content = fd.read()
+            if content and not content.endswith(b'\n'):
+                logger.warning('removing partial outbox record')
+                fd.truncate(content.rfind(b'\n') + 1)
+                fd.flush()
+                os.fsync(fd.fileno())
+
+    def _apply(self, record):
+        key = record['key']
+        if record.get('delivered'):
+            self.pending.pop(key, None)
+            self.attempts.pop(key, None)
+            self._remember(key)
+        elif record.get('failed'):
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+        elif key not in self.delivered:
+            self.pending[key] = record
+
+    def _remember(self, key):
+        self.delivered[key] = True
+        while len(self.delivered) > DELIVERED_KEYS_SIZE:
+            self.delivered.popitem(last=False)
+
+    def _append(self, record):
+        with open(self.filename, 'a') as fd:
+            # dates are stored as strings like they are rendered in templates
+            fd.write(json.dumps(record, default=str) + '\n')
+            fd.flush()
+            os.fsync(fd.fileno())
+        self.records += 1
+
+    def add(self, key, method, arguments):
+        if key in self.pending or key in self.delivered:
+            logger.debug(f'notification {key} already in outbox')
+            return False
+        record = json.loads(json.dumps({'key': key, 'method': method, 'arguments': arguments}, default=str))
+        self._append(record)
+        self.pending[key] = record
+        return True
+
+    def merge(self, filename):
+        """Add pending notifications of another outbox file, then remove this file, and return the number added"""
+        other = Outbox(filename)
+        count = 0
+        for key, record in other.pending.items():
+            if self.add(key=key, method=record['method'], arguments=record['arguments']):
+                count += 1
+        # notifications are safely on disk in this outbox
+        os.unlink(filename)
+        return count
+
+    def deliver(self, notifier):
+        """Send pending notifications in order and return the number of notifications sent"""
+        started = time.monotonic()
+        count = 0
+        for key, record in list(self.pending.items()):
+            try:
+                getattr(notifier, f'notify_{record["method"]}')(**record['arguments'])
+            except Exception as err:
+                logger.error(f'failed to send notification {key}')
+                logger.exception(err)
+                self._append({'key': key, 'failed': True})
+                self._apply({'key': key, 'failed': True})
+                if self.attempts[key] >= MAX_ATTEMPTS:
+                    logger.error(f'dropping notification {key} after {MAX_ATTEMPTS} attempts')
+                    self._append({'key': key, 'delivered': True})
+                    self._apply({'key': key, 'delivered': True})
+                # retry on next cycle without holding back the next notifications
+                continue
+            logger.info(f'{record["method"]} notification sent')
+            self._append({'key': key, 'delivered': True})
+            self._apply({'key': key, 'delivered': True})
+            count += 1
+        elapsed = time.monotonic() - started
+        if count:
+            throughput = count / elapsed if elapsed else count
+            logger.info(f'{count} notification(s) delivered in {elapsed:.2f}s ({throughput:.1f}/s)')
+        if self.pending:
+            logger.warning(f'{len(self.pending)} notification(s) waiting in outbox')
+        if self.records > max(COMPACTION_SIZE, 2 * (len(self.delivered) + len(self.pending))):
+            self.compact()
+        return count
+
+    def compact(self):
+        logger.debug('compacting outbox')
+        records = [{'key': key, 'delivered': True} for key in self.delivered]
+        for key, record in self.pending.items():
+            records.append(record)
+            records.extend([{'key': key, 'failed': True}] * self.attempts.get(key, 0))
+        temporary_filename = f'{self.filename}.tmp'
+        with open(temporary_filename, 'w') as fd:
+            for record in records:
+                fd.write(json.dumps(record) + '\n')
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(temporary_filename, self.filename)
+        self.records = len(records)
@@ -1,32 +1,105 @@
 import logging
+import time
+from datetime import datetime
+
+from earnings import EarningsEstimator
+from rolling import BlockStatistics
+from utils import format_hashrate
 
 logger = logging.getLogger(__name__)
 
 MAX_NOTIFICATIONS_COUNT = 5
 
 
+class Worker:
+    def __init__(self, name, online, reported_hashrate, effective_hashrate, valid_shares, stale_shares):
+        self.name = name
+        self.online = online
+        self.reported_hashrate = reported_hashrate
+        self.effective_hashrate = effective_hashrate
+        self.valid_shares = valid_shares
+        self.stale_shares = stale_shares
+
+    def to_dict(self):
+        return {'online': self.online, 'reported_hashrate': self.reported_hashrate,
+                'effective_hashrate': self.effective_hashrate, 'valid_shares': self.valid_shares,
+                'stale_shares': self.stale_shares}
+
+    def __repr__(self):
+        attributes = {'online': self.online, 'reported_hashrate': format_hashrate(self.reported_hashrate),
+                      'effective_hashrate': format_hashrate(self.effective_hashrate),
+                      'valid_shares': self.valid_shares, 'stale_shares': self.stale_shares}
+        formatted_attributes = ' '.join([f'{k}="{v}"' for k, v in attributes.items()])
+        return f'<Worker #{self.name} ({formatted_attributes})>'
+
+
 class Handler:
-    def __init__(self, pool_name, exchange_rate=None, currency=None, notifier=None):
+    def __init__(self, pool_name, exchange_rate=None, currency=None, notifier=None, rates=None,
+                 block_statistics=None, earnings=None, min_worker_hashrate=None, outbox=None, timeseries=None,
+                 rules=None):
         self.pool_name = pool_name
         self.exchange_rate = exchange_rate
         self.currency = currency
         self.notifier = notifier
+        self.rates = rates
+        self.block_statistics = BlockStatistics(**(block_statistics or {}))
+        self.earnings = {address: EarningsEstimator(**estimator) for address, estimator in (earnings or {}).items()}
+        self.min_worker_hashrate = min_worker_hashrate
+        self.outbox = outbox
+        self.timeseries = timeseries
+        self.rules = rules
+
+    def _record(self, name, value, timestamp=None):
+        if self.timeseries:
+            self.timeseries.update(name=f'{self.pool_name}.{name}', value=value, timestamp=timestamp)
+
+    def _notify(self, key, method, arguments, event=None):
+        if self.rules:
+            notify, chat_id = self.rules.evaluate(method=method, event=event or {})
+            if not notify:
+                logger.debug(f'{method} notification filtered by rules')
+                return
+            if chat_id:
+                arguments = dict(arguments, chat_id=chat_id)
+        if self.outbox:
+            # delivered later, even if the state has advanced in the meantime
+            if self.outbox.add(key=key, method=method, arguments=arguments):
+                logger.debug(f'{method} notification added to outbox')
+        elif self.notifier:
+            logger.debug(f'sending {method} notification')
+            try:
+                getattr(self.notifier, f'notify_{method}')(**arguments)
+                logger.info(f'{method} notification sent')
+            except Exception as err:
+                logger.error('failed to send notification')
+                logger.exception(err)
+
+    def _estimate_payout(self, miner):
+        now = time.time()
+        estimator = self.earnings.setdefault(miner.address, EarningsEstimator())
+        estimator.add(timestamp=now, balance=miner.raw_balance)
+        payout_eta = estimator.estimate(balance=miner.raw_balance, payout_threshold=miner.payout_threshold, now=now)
+        if payout_eta:
+            logger.debug(f'next payout estimated at {datetime.fromtimestamp(payout_eta)}')
+            return datetime.fromtimestamp(int(max(payout_eta, now)))
 
     def _watch_miner_balance(self, miner, last_balance=None):
         logger.debug('watching miner balance')
+        payout_eta = self._estimate_payout(miner)
+        self._record(name=f'{miner.address}.balance', value=miner.raw_balance)
         if miner.raw_balance != last_balance:
             logger.info('miner balance has changed')
-            if self.notifier:
-                logger.debug('sending balance notification')
-                arguments = {'pool': self.pool_name, 'address': miner.address, 'url': miner.url,
-                             'balance': miner.balance, 'balance_fiat': miner.balance_fiat,
-                             'balance_percentage': miner.balance_percentage}
-                try:
-                    self.notifier.notify_balance(**arguments)
-                    logger.info('balance notification sent')
-                except Exception as err:
-                    logger.error('failed to send notification')
-                    logger.exception(err)
+            arguments = {'pool': self.pool_name, 'address': miner.address, 'url': miner.url,
+                         'balance': miner.balance, 'balance_fiat': miner.balance_fiat,
+                         'balance_percentage': miner.balance_percentage, 'payout_eta': payout_eta}
+            event = {'balance': miner.raw_balance,
+                     'balance_percentage': miner.raw_balance * 100 / miner.payout_threshold,
+                     'previous_balance_percentage': None}
+            if last_balance is not None:
+                event['previous_balance_percentage'] = last_balance * 100 / miner.payout_threshold
+            # the same balance comes back after each payment, the change is identified by both balances
+            self._notify(key=f'{self.pool_name}:balance:{miner.address}:{last_balance}:{miner.raw_balance}',
+                         method='balance', arguments=arguments, event=event)
         return miner.raw_balance
 
     def _watch_miner_payments(self, miner, last_transaction=None):
@@ -34,16 +107,45 @@ class Handler:
         if miner.last_transaction and (not last_transaction or miner.last_transaction.txid != last_transaction):
             # send notifications for last payment only
             logger.info(f'new payment {miner.last_transaction.txid}')
-            if self.notifier:
-                logger.debug('sending payment notification')
-                arguments = {'pool': self.pool_name, 'address': miner.address, 'txid': miner.last_transaction.txid,
-                             'amount': miner.last_transaction.amount, 'amount_fiat': miner.last_transaction.amount_fiat,
-                             'time': miner.last_transaction.time, 'duration': miner.last_transaction.duration}
-                try:
-                    self.notifier.notify_payment(**arguments)
-                    logger.info('payment notification sent')
-                except Exception as err:
-                    logger.error('failed to send notification')
-                    logger.exception(err)
+            arguments = {'pool': self.pool_name, 'address': miner.address, 'txid': miner.last_transaction.txid,
+                         'amount': miner.last_transaction.amount, 'amount_fiat': miner.last_transaction.amount_fiat,
+                         'time': miner.last_transaction.time, 'duration': miner.last_transaction.duration}
+            self._notify(key=f'{self.pool_name}:payment:{miner.last_transaction.txid}', method='payment',
+                         arguments=arguments, event={'amount': miner.last_transaction.raw_amount})
         if miner.last_transaction and miner.last_transaction.txid:
             return miner.last_transaction.txid
+
+    def _watch_workers(self, address, url, workers, last_workers=None):
+        logger.debug('watching miner workers')
+        offline_workers = []
+        slow_workers = []
+        current_workers = {}
+        for worker in workers:
+            current_workers[worker.name] = worker.to_dict()
+            if last_workers is None or worker.name not in last_workers:
+                # don't spam worker notifications at initialization
+                continue
+            last_worker = last_workers[worker.name]
+            if not worker.online:
+                if last_worker['online']:
+                    offline_workers.append(worker.name)
+            elif self.min_worker_hashrate and worker.effective_hashrate < self.min_worker_hashrate:
+                if not last_worker['online'] or last_worker['effective_hashrate'] >= self.min_worker_hashrate:
+                    slow_workers.append(f'{worker.name} ({format_hashrate(worker.effective_hashrate)})')
+        self._record(name=f'{address}.hashrate', value=sum([worker.effective_hashrate for worker in workers]))
+        for name, last_worker in (last_workers or {}).items():
+            # workers are removed from the pool some time after they stop
+            if name not in current_workers and last_worker['online']:
+                offline_workers.append(name)
+        if offline_workers:
+            logger.info(f'{len(offline_workers)} worker(s) offline')
+        if slow_workers:
+            logger.info(f'{len(slow_workers)} worker(s) below {format_hashrate(self.min_worker_hashrate)}')
+        if offline_workers or slow_workers:
+            arguments = {'pool': self.pool_name, 'address': address, 'url': url,
+                         'offline_workers': ', '.join(offline_workers) or None,
+                         'slow_workers': ', '.join(slow_workers) or None}
+            event = {'offline_workers': len(offline_workers), 'slow_workers': len(slow_workers)}
+            self._notify(key=f'{self.pool_name}:workers:{address}:{int(time.time())}', method='workers',
+                         arguments=arguments, event=event)
+        return current_workers
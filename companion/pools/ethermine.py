@@ -1,28 +1,32 @@
 import logging
+import time
 from datetime import datetime
 
 from ethermine import Ethermine
 from humanfriendly import format_timespan
-from pools import Handler
+from pools import Handler, Worker
 from utils import convert_fiat, format_weis
 
 logger = logging.getLogger(__name__)
 
 eth = Ethermine()
 
+# workers without share in this period are offline
+WORKER_OFFLINE_PERIOD = 1800
+
 
 class Miner:
-    def __init__(self, address, exchange_rate=None, currency=None):
+    def __init__(self, address, exchange_rate=None, currency=None, rates=None):
         self.address = address
         self.raw_balance = self.get_unpaid_balance(address)
         self.balance = format_weis(self.raw_balance)
         self.balance_fiat = None
         if exchange_rate and currency:
             self.balance_fiat = convert_fiat(amount=self.raw_balance, exchange_rate=exchange_rate, currency=currency)
-        payout_threshold = self.get_payout_threshold(address)
-        self.balance_percentage = self.format_balance_percentage(payout_threshold=payout_threshold,
+        self.payout_threshold = self.get_payout_threshold(address)
+        self.balance_percentage = self.format_balance_percentage(payout_threshold=self.payout_threshold,
                                                                  balance=self.raw_balance)
-        self.transactions = self.get_payouts(address, exchange_rate, currency)
+        self.transactions = self.get_payouts(address, exchange_rate, currency, rates)
 
     @staticmethod
     def get_unpaid_balance(address):
@@ -30,14 +34,14 @@ class Miner:
         return dashboard['currentStatistics']['unpaid']
 
     @staticmethod
-    def get_payouts(address, exchange_rate=None, currency=None):
+    def get_payouts(address, exchange_rate=None, currency=None, rates=None):
         payouts = eth.miner_payouts(address)
         # convert to transactions
         transactions = []
         for payout in payouts:
             transaction = Transaction(txid=payout['txHash'], timestamp=payout['paidOn'], amount=payout['amount'],
                                       duration=payout['end']-payout['start'], exchange_rate=exchange_rate,
-                                      currency=currency)
+                                      currency=currency, rates=rates)
             transactions.append(transaction)
         # sort by older timestamp first
         return sorted(transactions)
@@ -69,13 +73,16 @@ class Miner:
 
 
 class Transaction:
-    def __init__(self, txid, amount, timestamp, duration, exchange_rate=None, currency=None):
+    def __init__(self, txid, amount, timestamp, duration, exchange_rate=None, currency=None, rates=None):
         self.txid = txid
         self.time = datetime.fromtimestamp(timestamp)
         self.raw_amount = amount
         self.amount = format_weis(amount)
         self.amount_fiat = None
         self.duration = format_timespan(duration)
+        if rates:
+            # price at the time the payment was sent
+            exchange_rate = rates.get(timestamp) or exchange_rate
         if exchange_rate and currency:
             self.amount_fiat = convert_fiat(amount=self.raw_amount, exchange_rate=exchange_rate, currency=currency)
 
@@ -96,8 +103,12 @@ class Transaction:
 
 
 class EthermineHandler(Handler):
-    def __init__(self, exchange_rate=None, currency=None, notifier=None, pool_name='ethermine'):
-        super().__init__(pool_name=pool_name, exchange_rate=exchange_rate, currency=currency, notifier=notifier)
+    def __init__(self, exchange_rate=None, currency=None, notifier=None, pool_name='ethermine', rates=None,
+                 block_statistics=None, earnings=None, min_worker_hashrate=None, outbox=None, timeseries=None,
+                 rules=None):
+        super().__init__(pool_name=pool_name, exchange_rate=exchange_rate, currency=currency, notifier=notifier,
+                         rates=rates, block_statistics=block_statistics, earnings=earnings,
+                         min_worker_hashrate=min_worker_hashrate, outbox=outbox, timeseries=timeseries, rules=rules)
 
     def watch_blocks(self, last_block=None):
         logger.debug('not implemented yet')
@@ -105,11 +116,11 @@ class EthermineHandler(Handler):
     def watch_miner(self, address, last_balance=None, last_transaction=None):
         logger.debug(f'watching miner {address}')
         try:
-            miner = Miner(address=address, exchange_rate=self.exchange_rate, currency=self.currency)
+            miner = Miner(address=address, exchange_rate=self.exchange_rate, currency=self.currency, rates=self.rates)
         except Exception as err:
             logger.error(f'miner {address} not found')
             logger.exception(err)
-            return
+            return None, None
 
         logger.debug(miner)
 
@@ -117,3 +128,25 @@ class EthermineHandler(Handler):
         last_transaction = self._watch_miner_payments(miner=miner, last_transaction=last_transaction)
 
         return last_balance, last_transaction
+
+    def watch_workers(self, address, last_workers=None):
+        logger.debug(f'watching miner {address} workers')
+        try:
+            workers = self.get_workers(address)
+        except Exception as err:
+            logger.error(f'failed to get miner {address} workers')
+            logger.exception(err)
+            return
+        return self._watch_workers(address=address, url=f'https://ethermine.org/miners/{address}/dashboard',
+                                   workers=workers, last_workers=last_workers)
+
+    @staticmethod
+    def get_workers(address):
+        now = time.time()
+        workers = []
+        for worker in eth.miner_workers(address):
+            workers.append(Worker(name=worker['worker'], online=worker['lastSeen'] >= now - WORKER_OFFLINE_PERIOD,
+                                  reported_hashrate=worker['reportedHashrate'],
+                                  effective_hashrate=worker['currentHashrate'], valid_shares=worker['validShares'],
+                                  stale_shares=worker['staleShares']))
+        return workers
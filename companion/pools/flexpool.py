@@ -1,8 +1,9 @@
 import logging
 
 import flexpoolapi
+import requests
 from humanfriendly import format_timespan
-from pools import MAX_NOTIFICATIONS_COUNT, Handler
+from pools import MAX_NOTIFICATIONS_COUNT, Handler, Worker
 from utils import convert_fiat, convert_weis, format_weis
 
 logger = logging.getLogger(__name__)
@@ -12,15 +13,21 @@ MAX_PAYMENTS_COUNT = 10
 
 
 class Block:
-    def __init__(self, number, hash, time, round_time, reward, luck, exchange_rate=None, currency=None):
+    def __init__(self, number, hash, time, round_time, reward, luck, exchange_rate=None, currency=None, rates=None):
         self.number = int(number)
         self.hash = hash
         self.time = time
+        self.raw_round_time = round_time
         self.round_time = format_timespan(round_time)
+        self.raw_reward = reward
         self.reward = format_weis(reward)
         self.reward_fiat = None
+        if rates:
+            # price at the time the block was mined
+            exchange_rate = rates.get(time) or exchange_rate
         if exchange_rate and currency:
             self.reward_fiat = convert_fiat(amount=reward, exchange_rate=exchange_rate, currency=currency)
+        self.raw_luck = luck
         self.luck = f'{int(luck*100)}%'
 
     def __lt__(self, block):
@@ -35,7 +42,7 @@ class Block:
 
 
 class Miner:
-    def __init__(self, address, exchange_rate=None, currency=None):
+    def __init__(self, address, exchange_rate=None, currency=None, rates=None):
         self.address = address
         miner = flexpoolapi.miner(address)
         self.raw_balance = miner.balance()
@@ -43,10 +50,10 @@ class Miner:
         self.balance_fiat = None
         if exchange_rate and currency:
             self.balance_fiat = convert_fiat(amount=self.raw_balance, exchange_rate=exchange_rate, currency=currency)
-        payout_threshold = self.get_payout_threshold(miner)
-        self.balance_percentage = self.format_balance_percentage(payout_threshold=payout_threshold,
+        self.payout_threshold = self.get_payout_threshold(miner)
+        self.balance_percentage = self.format_balance_percentage(payout_threshold=self.payout_threshold,
                                                                  balance=self.raw_balance)
-        self.transactions = self.get_payements(miner, exchange_rate=exchange_rate, currency=currency)
+        self.transactions = self.get_payements(miner, exchange_rate=exchange_rate, currency=currency, rates=rates)
 
     @property
     def url(self):
@@ -61,7 +68,7 @@ class Miner:
         return f'{round(balance*100/payout_threshold, 2)}%'
 
     @staticmethod
-    def get_payements(miner, exchange_rate=None, currency=None):
+    def get_payements(miner, exchange_rate=None, currency=None, rates=None):
         # crawl payments
         transactions = []
         payments_count = 0
@@ -75,7 +82,7 @@ class Miner:
                 # convert to transaction
                 transaction = Transaction(txid=payment.txid, time=payment.time, amount=payment.amount,
                                           duration=payment.duration, exchange_rate=exchange_rate,
-                                          currency=currency)
+                                          currency=currency, rates=rates)
                 transactions.append(transaction)
                 payments_count += 1
             current_page += 1
@@ -99,13 +106,16 @@ class Miner:
 
 
 class Transaction:
-    def __init__(self, txid, amount, time, duration, exchange_rate=None, currency=None):
+    def __init__(self, txid, amount, time, duration, exchange_rate=None, currency=None, rates=None):
         self.txid = txid
         self.time = time
         self.raw_amount = amount
         self.amount = format_weis(amount)
         self.amount_fiat = None
         self.duration = format_timespan(duration)
+        if rates:
+            # price at the time the payment was sent
+            exchange_rate = rates.get(time) or exchange_rate
         if exchange_rate and currency:
             self.amount_fiat = convert_fiat(amount=self.raw_amount, exchange_rate=exchange_rate, currency=currency)
 
@@ -122,36 +132,53 @@ class Transaction:
 
 
 class FlexpoolHandler(Handler):
-    def __init__(self, exchange_rate=None, currency=None, notifier=None, pool_name='flexpool'):
-        super().__init__(pool_name=pool_name, exchange_rate=exchange_rate, currency=currency, notifier=notifier)
+    def __init__(self, exchange_rate=None, currency=None, notifier=None, pool_name='flexpool', rates=None,
+                 block_statistics=None, earnings=None, min_worker_hashrate=None, outbox=None, timeseries=None,
+                 rules=None):
+        super().__init__(pool_name=pool_name, exchange_rate=exchange_rate, currency=currency, notifier=notifier,
+                         rates=rates, block_statistics=block_statistics, earnings=earnings,
+                         min_worker_hashrate=min_worker_hashrate, outbox=outbox, timeseries=timeseries, rules=rules)
 
     def watch_blocks(self, last_block=None):
         logger.debug('watching last blocks')
         last_remote_block = None
-        blocks = self.get_blocks(exchange_rate=self.exchange_rate, currency=self.currency)
+        blocks = self.get_blocks(exchange_rate=self.exchange_rate, currency=self.currency, rates=self.rates)
         if blocks:
             # don't spam block notification at initialization
             notification_slice = MAX_NOTIFICATIONS_COUNT if len(blocks) > MAX_NOTIFICATIONS_COUNT else 0
-            for block in blocks[notification_slice:]:
+            for index, block in enumerate(blocks):
                 if not last_block or last_block < block.number:
                     logger.info(f'new block {block.number}')
-                    if self.notifier:
-                        logger.debug('sending block notification')
-                        arguments = {'pool': self.pool_name, 'number': block.number, 'hash': block.hash,
-                                     'reward': block.reward, 'time': block.time, 'round_time': block.round_time,
-                                     'luck': block.luck, 'reward_fiat': block.reward_fiat}
-                        try:
-                            self.notifier.notify_block(**arguments)
-                            logger.info('block notification sent')
-                        except Exception as err:
-                            logger.error('failed to send notification')
-                            logger.exception(err)
+                    anomalies = self.block_statistics.add(luck=block.raw_luck, round_time=block.raw_round_time)
+                    self._record(name='luck', value=block.raw_luck, timestamp=block.time.timestamp())
+                    self._record(name='reward', value=block.raw_reward, timestamp=block.time.timestamp())
+                    if index >= notification_slice:
+                        self._notify_block(block=block, anomalies=anomalies)
                 last_remote_block = block
         if last_remote_block and last_remote_block.number:
             return last_remote_block.number
 
+    def _notify_block(self, block, anomalies=None):
+        statistics = self.block_statistics
+        arguments = {'pool': self.pool_name, 'number': block.number, 'hash': block.hash,
+                     'reward': block.reward, 'time': block.time, 'round_time': block.round_time,
+                     'luck': block.luck, 'reward_fiat': block.reward_fiat,
+                     'luck_average': f'{int(statistics.luck.mean*100)}%',
+                     'luck_ewma': f'{int(statistics.luck.ewma*100)}%',
+                     'round_time_average': format_timespan(statistics.round_time.mean),
+                     'unlucky_streak': statistics.unlucky_streak}
+        event = {'number': block.number, 'reward': block.raw_reward, 'luck': block.raw_luck,
+                 'round_time': block.raw_round_time, 'unlucky_streak': statistics.unlucky_streak}
+        self._notify(key=f'{self.pool_name}:block:{block.hash}', method='block', arguments=arguments, event=event)
+        if anomalies:
+            logger.info(f'unusual block {block.number}: {", ".join(anomalies)}')
+            arguments = {'pool': self.pool_name, 'number': block.number, 'hash': block.hash,
+                         'reasons': ', '.join(anomalies)}
+            self._notify(key=f'{self.pool_name}:block_anomaly:{block.hash}', method='block_anomaly',
+                         arguments=arguments, event=event)
+
     @staticmethod
-    def get_blocks(exchange_rate=None, currency=None):
+    def get_blocks(exchange_rate=None, currency=None, rates=None):
         try:
             remote_blocks = flexpoolapi.pool.last_blocks(count=MAX_BLOCKS_COUNT)
             # convert to blocks
@@ -160,7 +187,8 @@ class FlexpoolHandler(Handler):
                 for remote_block in remote_blocks:
                     block = Block(number=remote_block.number, hash=remote_block.hash, time=remote_block.time,
                                   round_time=remote_block.round_time, reward=remote_block.total_rewards,
-                                  luck=remote_block.luck, exchange_rate=exchange_rate, currency=currency)
+                                  luck=remote_block.luck, exchange_rate=exchange_rate, currency=currency,
+                                  rates=rates)
                     blocks.append(block)
             # sort by block number
             return sorted(blocks)
@@ -171,7 +199,7 @@ class FlexpoolHandler(Handler):
     def watch_miner(self, address, last_balance=None, last_transaction=None):
         logger.debug(f'watching miner {address}')
         try:
-            miner = Miner(address=address, exchange_rate=self.exchange_rate, currency=self.currency)
+            miner = Miner(address=address, exchange_rate=self.exchange_rate, currency=self.currency, rates=self.rates)
             logger.debug(miner)
 
             last_balance = self._watch_miner_balance(miner=miner, last_balance=last_balance)
@@ -188,3 +216,34 @@ class FlexpoolHandler(Handler):
             logger.warning('failed to get miner from Flexpool API')
             logger.debug(err)
         return None, None
+
+    def watch_workers(self, address, last_workers=None):
+        logger.debug(f'watching miner {address} workers')
+        try:
+            workers = self.get_workers(address)
+            return self._watch_workers(address=address, url=f'https://flexpool.io/{address}', workers=workers,
+                                       last_workers=last_workers)
+        except flexpoolapi.exceptions.InvalidMinerAddress as err:
+            logger.error(f'miner address {address} is invalid')
+            logger.debug(err)
+        except flexpoolapi.exceptions.MinerDoesNotExist as err:
+            logger.error(f'miner {address} not found')
+            logger.debug(err)
+        except flexpoolapi.exceptions.APIError as err:
+            logger.warning('failed to get workers from Flexpool API')
+            logger.debug(err)
+
+    @staticmethod
+    def get_workers(address):
+        miner = flexpoolapi.miner(address)
+        # flexpoolapi workers only have names, hashrates and shares are in the same response
+        r = requests.get(f'{miner.endpoint}/workers/')
+        flexpoolapi.shared.check_response(r)
+        workers = []
+        for worker in r.json()['result']:
+            workers.append(Worker(name=worker['name'], online=worker['online'],
+                                  reported_hashrate=worker.get('reported_hashrate', 0),
+                                  effective_hashrate=worker.get('effective_hashrate', 0),
+                                  valid_shares=worker.get('valid_shares', 0),
+                                  stale_shares=worker.get('stale_shares', 0)))
+        return workers
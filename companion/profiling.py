@@ -0,0 +1,67 @@
+import cProfile
+import logging
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TOP_COUNT = 30
+
+
+class CycleProfiler:
+    """Profile CPU and memory of one cycle out of "every" cycles
+
+    Reports of a profiled cycle replace the reports of the previous one.
+    """
+
+    def __init__(self, cpu_file=None, memory_file=None, every=1):
+        self.cpu_file = cpu_file
+        self.memory_file = memory_file
+        self.every = every
+        self.cycles = 0
+
+    @property
+    def enabled(self):
+        return bool(self.cpu_file or self.memory_file)
+
+    @contextmanager
+    def profile(self):
+        self.cycles += 1
+        if not self.enabled or (self.cycles - 1) % self.every:
+            yield
+            return
+        logger.debug(f'profiling cycle {self.cycles}')
+        profiler = None
+        if self.memory_file:
+            tracemalloc.start()
+        if self.cpu_file:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                self._write_cpu_report(profiler)
+            if self.memory_file:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self._write_memory_report(snapshot, current=current, peak=peak)
+
+    def _write_cpu_report(self, profiler):
+        with open(self.cpu_file, 'w') as fd:
+            fd.write(f'cycle {self.cycles}\n')
+            stats = pstats.Stats(profiler, stream=fd)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_COUNT)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_COUNT)
+        logger.info(f'cpu profile written to {self.cpu_file}')
+
+    def _write_memory_report(self, snapshot, current, peak):
+        with open(self.memory_file, 'w') as fd:
+            fd.write(f'cycle {self.cycles}\n')
+            fd.write(f'current: {current} bytes, peak: {peak} bytes\n\n')
+            for statistic in snapshot.statistics('lineno')[:TOP_COUNT]:
+                fd.write(f'{statistic}\n')
+        logger.info(f'memory profile written to {self.memory_file}')
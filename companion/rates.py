@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from coingecko import get_rate_range
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+# first fill covers this period in a single call (hourly granularity on coingecko)
+HISTORY_PERIOD = 90 * 24 * 3600
+# lookups this close to the cached range are answered without fetching
+REFRESH_PERIOD = 3600
+# extra period fetched before an old lookup to have a point to interpolate from
+FETCH_MARGIN = 24 * 3600
+
+
+class RateCache:
+    """Time-indexed exchange rates persisted in a JSON file
+
+    Prices are filled in bulk from the coingecko range endpoint then looked up with a binary search and a linear
+    interpolation between the two closest points.
+    """
+
+    def __init__(self, filename, ids, vs_currencies):
+        self.filename = filename
+        self.ids = ids
+        self.vs_currencies = vs_currencies
+        self.key = f'{ids}/{vs_currencies}'.lower()
+        self.start = None
+        self.end = None
+        self.timestamps = []
+        self.prices = []
+        # don't retry during the same run once the coingecko api has failed
+        self.failed = False
+        self.read()
+
+    def read(self):
+        if os.path.isfile(self.filename):
+            with open(self.filename, 'r') as fd:
+                content = json.load(fd).get(self.key, {})
+            self.start = content.get('start')
+            self.end = content.get('end')
+            self.timestamps = content.get('timestamps', [])
+            self.prices = content.get('prices', [])
+
+    def write(self):
+        content = {}
+        if os.path.isfile(self.filename):
+            with open(self.filename, 'r') as fd:
+                content = json.load(fd)
+        content[self.key] = {'start': self.start, 'end': self.end, 'timestamps': self.timestamps,
+                             'prices': self.prices}
+        with open(self.filename, 'w') as fd:
+            json.dump(content, fd)
+
+    def fetch(self, start, end):
+        prices = get_rate_range(ids=self.ids, vs_currencies=self.vs_currencies, from_timestamp=start,
+                                to_timestamp=end)
+        merged = dict(zip(self.timestamps, self.prices))
+        merged.update(prices)
+        self.timestamps = sorted(merged)
+        self.prices = [merged[timestamp] for timestamp in self.timestamps]
+        self.start = start if self.start is None else min(self.start, start)
+        self.end = end if self.end is None else max(self.end, end)
+        self.write()
+
+    def get(self, timestamp):
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+        now = int(time.time())
+        if self.failed:
+            return self.interpolate(timestamp)
+        try:
+            if self.start is None:
+                logger.debug('filling exchange rates cache')
+                self.fetch(start=int(min(timestamp - FETCH_MARGIN, now - HISTORY_PERIOD)), end=now)
+            elif timestamp < self.start:
+                logger.debug('extending exchange rates cache to the past')
+                self.fetch(start=int(timestamp - FETCH_MARGIN), end=self.start)
+            elif timestamp > self.end + REFRESH_PERIOD:
+                logger.debug('extending exchange rates cache to now')
+                self.fetch(start=self.end, end=now)
+        except RequestException as err:
+            logger.warning(f'failed to get {self.key} rates')
+            logger.debug(str(err))
+            self.failed = True
+        return self.interpolate(timestamp)
+
+    def interpolate(self, timestamp):
+        if not self.timestamps:
+            return None
+        index = bisect_left(self.timestamps, timestamp)
+        if index == 0:
+            return self.prices[0]
+        if index == len(self.timestamps):
+            return self.prices[-1]
+        previous_timestamp, next_timestamp = self.timestamps[index - 1], self.timestamps[index]
+        previous_price, next_price = self.prices[index - 1], self.prices[index]
+        ratio = (timestamp - previous_timestamp) / (next_timestamp - previous_timestamp)
+        return previous_price + (next_price - previous_price) * ratio
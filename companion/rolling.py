@@ -0,0 +1,93 @@
+from bisect import bisect_left, insort
+
+WINDOW_SIZE = 100
+EWMA_ALPHA = 0.1
+# minimum number of blocks in the window before raising percentile anomalies
+MIN_SAMPLES = 20
+ANOMALY_PERCENTILE = 95
+UNLUCKY_STREAK_THRESHOLD = 5
+
+
+class RollingWindow:
+    """Ring buffer of the last values with running sum, EWMA and sorted copy for percentiles"""
+
+    def __init__(self, values=None, ewma=None, size=WINDOW_SIZE, alpha=EWMA_ALPHA):
+        self.size = size
+        self.alpha = alpha
+        self.values = []
+        self.sorted_values = []
+        self.position = 0
+        self.total = 0
+        for value in (values or [])[-size:]:
+            self._append(value)
+        self.ewma = ewma
+
+    def _append(self, value):
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            # overwrite the oldest value
+            oldest = self.values[self.position]
+            self.values[self.position] = value
+            self.position = (self.position + 1) % self.size
+            self.total -= oldest
+            del self.sorted_values[bisect_left(self.sorted_values, oldest)]
+        self.total += value
+        insort(self.sorted_values, value)
+
+    def push(self, value):
+        self._append(value)
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def mean(self):
+        if self.values:
+            return self.total / len(self.values)
+
+    def percentile(self, percent):
+        if self.sorted_values:
+            index = min(len(self.sorted_values) - 1, int(len(self.sorted_values) * percent / 100))
+            return self.sorted_values[index]
+
+    def to_dict(self):
+        # oldest first
+        return {'values': self.values[self.position:] + self.values[:self.position], 'ewma': self.ewma}
+
+
+class BlockStatistics:
+    """Rolling luck and round time of the last blocks found by a pool
+
+    Luck is the round effort, a block above 100% is unlucky.
+    """
+
+    def __init__(self, luck=None, round_time=None, unlucky_streak=0, lucky_streak=0):
+        self.luck = RollingWindow(**(luck or {}))
+        self.round_time = RollingWindow(**(round_time or {}))
+        self.unlucky_streak = unlucky_streak
+        self.lucky_streak = lucky_streak
+
+    def add(self, luck, round_time):
+        """Update statistics with a new block and return reasons why the block is unusual"""
+        anomalies = []
+        if len(self.luck) >= MIN_SAMPLES and luck > self.luck.percentile(ANOMALY_PERCENTILE):
+            anomalies.append(f'luck {int(luck*100)}% above the {ANOMALY_PERCENTILE}th percentile')
+        if len(self.round_time) >= MIN_SAMPLES and round_time > self.round_time.percentile(ANOMALY_PERCENTILE):
+            anomalies.append(f'round time above the {ANOMALY_PERCENTILE}th percentile')
+        if luck > 1:
+            self.unlucky_streak += 1
+            self.lucky_streak = 0
+        else:
+            self.lucky_streak += 1
+            self.unlucky_streak = 0
+        if self.unlucky_streak and self.unlucky_streak % UNLUCKY_STREAK_THRESHOLD == 0:
+            anomalies.append(f'{self.unlucky_streak} unlucky blocks in a row')
+        self.luck.push(luck)
+        self.round_time.push(round_time)
+        return anomalies
+
+    def to_dict(self):
+        return {'luck': self.luck.to_dict(), 'round_time': self.round_time.to_dict(),
+                'unlucky_streak': self.unlucky_streak, 'lucky_streak': self.lucky_streak}
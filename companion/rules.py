@@ -0,0 +1,109 @@
+import logging
+import operator
+
+from config import InvalidConfigException
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq,
+             '!=': operator.ne}
+# fields of the events sent by handlers to the rules
+BLOCK_FIELDS = ['number', 'reward', 'luck', 'round_time', 'unlucky_streak']
+EVENT_FIELDS = {'block': BLOCK_FIELDS, 'block_anomaly': BLOCK_FIELDS, 'balance': ['balance', 'balance_percentage'],
+                'payment': ['amount'], 'workers': ['offline_workers', 'slow_workers']}
+
+
+class Condition:
+    def __init__(self, field, compare, value):
+        self.field = field
+        self.compare = compare
+        self.value = value
+
+    def __call__(self, event):
+        return event.get(self.field) is not None and self.compare(event[self.field], self.value)
+
+
+class Crossing:
+    """True when the field has crossed a multiple of the step since its previous value"""
+
+    def __init__(self, field, step):
+        self.field = field
+        self.previous_field = f'previous_{field}'
+        self.step = step
+
+    def __call__(self, event):
+        if event.get(self.previous_field) is None:
+            return True
+        return event[self.field] // self.step != event[self.previous_field] // self.step
+
+
+class Rule:
+    def __init__(self, name, event, conditions=None, action='notify', chat_id=None):
+        self.name = name
+        self.event = event
+        if event not in EVENT_FIELDS:
+            raise InvalidConfigException(f'unknown event {event} in rule "{name}"')
+        self.conditions = []
+        for condition in conditions or []:
+            if condition['field'] not in EVENT_FIELDS[event]:
+                # the condition would never match and drop every notification of the event
+                raise InvalidConfigException(f'unknown field {condition["field"]} of {event} event in rule "{name}", '
+                                             f'fields are {", ".join(EVENT_FIELDS[event])}')
+            self.conditions.append(self.compile_condition(**condition))
+        self.notify = action == 'notify'
+        self.chat_id = chat_id
+        self.matches = 0
+
+    @staticmethod
+    def compile_condition(field, operator, value):
+        if operator == 'crosses':
+            if value <= 0:
+                raise InvalidConfigException(f'crosses step of {field} must be positive')
+            return Crossing(field=field, step=value)
+        return Condition(field=field, compare=OPERATORS[operator], value=value)
+
+    def match(self, event):
+        for condition in self.conditions:
+            if not condition(event):
+                return False
+        self.matches += 1
+        return True
+
+
+class RuleEngine:
+    """Rules compiled once from the configuration and evaluated against each event
+
+    The first matching rule of an event decides to notify, optionally to another chat, or to drop it. An event is
+    dropped when it has rules but none of them matches. An event without rules is always notified.
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        self.rules_by_event = {}
+        for index, rule in enumerate(rules):
+            rule = Rule(name=rule.get('name', f'rule {index}'), event=rule['event'],
+                        conditions=rule.get('conditions'), action=rule.get('action', 'notify'),
+                        chat_id=rule.get('chat_id'))
+            if rule.name in [other_rule.name for other_rule in self.rules]:
+                # counters are reported by name
+                raise InvalidConfigException(f'rule name "{rule.name}" is used more than once')
+            self.rules.append(rule)
+            self.rules_by_event.setdefault(rule.event, []).append(rule)
+
+    def evaluate(self, method, event):
+        """Return whether to notify and the chat id to notify"""
+        rules = self.rules_by_event.get(method)
+        if not rules:
+            return True, None
+        for rule in rules:
+            if rule.match(event):
+                logger.debug(f'{method} event matches rule "{rule.name}"')
+                return rule.notify, rule.chat_id
+        return False, None
+
+    def reset_counters(self):
+        for rule in self.rules:
+            rule.matches = 0
+
+    def counters(self):
+        return {rule.name: rule.matches for rule in self.rules}
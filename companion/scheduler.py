@@ -0,0 +1,23 @@
+import time
+
+# poll more often in this period around the estimated payout
+PAYOUT_WINDOW = 900
+PAYOUT_INTERVAL = 60
+
+
+def next_delay(interval, payout_etas=None, now=None):
+    """Seconds to wait before the next cycle
+
+    Cycles are closer only in a bounded window around each estimated payout. A payout later than its window, like on
+    pools paying in batches, doesn't keep polling every minute.
+    """
+    if now is None:
+        now = time.time()
+    delay = interval
+    for payout_eta in payout_etas or []:
+        if abs(payout_eta - now) <= PAYOUT_WINDOW:
+            return min(interval, PAYOUT_INTERVAL)
+        if payout_eta > now:
+            # wake up at the beginning of the payout window
+            delay = min(delay, max(PAYOUT_INTERVAL, payout_eta - PAYOUT_WINDOW - now))
+    return delay
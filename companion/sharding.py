@@ -0,0 +1,64 @@
+import glob
+import hashlib
+import os
+import re
+from bisect import bisect
+
+# points per shard on the ring, more points spread addresses more evenly
+REPLICAS = 100
+
+
+def _hash(key):
+    return int(hashlib.md5(key.encode()).hexdigest(), 16)
+
+
+class HashRing:
+    """Consistent hashing of miner addresses to shards
+
+    Adding a shard only moves the addresses falling into its points of the ring, about 1/N of them.
+    """
+
+    def __init__(self, shards, replicas=REPLICAS):
+        points = sorted((_hash(f'{shard}:{replica}'), shard) for shard in range(shards) for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.shards = [shard for _, shard in points]
+
+    def get_shard(self, address):
+        index = bisect(self.hashes, _hash(address.lower())) % len(self.hashes)
+        return self.shards[index]
+
+
+def shard_filename(filename, shard_index, shards):
+    """Give each shard its own file, like state.1.json for the second shard
+
+    The first shard keeps the file name, so files written without shards are still used.
+    """
+    if shards <= 1 or shard_index == 0:
+        return filename
+    name, extension = os.path.splitext(filename)
+    return f'{name}.{shard_index}{extension}'
+
+
+def shard_filenames(filename):
+    """Return existing files of all shards, including shards of a previous number of shards"""
+    name, extension = os.path.splitext(filename)
+    pattern = re.compile(re.escape(os.path.basename(name)) + r'\.\d+' + re.escape(extension) + '$')
+    filenames = [filename] if os.path.isfile(filename) else []
+    for candidate in sorted(glob.glob(f'{glob.escape(name)}.*{glob.escape(extension)}')):
+        if pattern.match(os.path.basename(candidate)):
+            filenames.append(candidate)
+    return filenames
+
+
+def merge_metrics(metrics):
+    rules = {}
+    for shard_metrics in metrics:
+        for name, matches in shard_metrics.get('rules', {}).items():
+            rules[name] = rules.get(name, 0) + matches
+    return {'shards': len(metrics),
+            'miners': sum([shard_metrics['miners'] for shard_metrics in metrics]),
+            'notifications': sum([shard_metrics['notifications'] for shard_metrics in metrics]),
+            # shards run in parallel
+            'duration': max([shard_metrics['duration'] for shard_metrics in metrics], default=0),
+            'payout_etas': [payout_eta for shard_metrics in metrics for payout_eta in shard_metrics['payout_etas']],
+            'rules': rules}
@@ -3,8 +3,14 @@ import os
 
 
 class State:
+    """JSON state file, read once then updated in memory
+
+    Each write saves the file by default. Many writes can be saved at once with save=False then save().
+    """
+
     def __init__(self, filename):
         self.filename = filename
+        self.content = None
         self.create()
 
     def create(self):
@@ -13,21 +19,44 @@ class State:
                 json.dump({}, fd)
 
     def read(self):
-        with open(self.filename, 'r') as fd:
-            return json.load(fd)
+        if self.content is None:
+            with open(self.filename, 'r') as fd:
+                self.content = json.load(fd)
+        return self.content
+
+    def save(self):
+        with open(self.filename, 'w') as fd:
+            json.dump(self.read(), fd, indent=2, separators=(',', ': '))
 
-    def write(self, pool_name, block_number=None, miner_balance=None, miner_payment=None):
+    def write(self, pool_name, block_number=None, miner_balance=None, miner_payment=None, block_statistics=None,
+              miner_earnings=None, miner_workers=None, address=None, save=True):
         content = self.read()
         if pool_name not in content:
             content[pool_name] = {}
         if block_number is not None:
             content[pool_name]['block'] = block_number
+        if block_statistics:
+            content[pool_name]['block_statistics'] = block_statistics
+        miner_content = content[pool_name]
+        if address:
+            miner_content = content[pool_name].setdefault('miners', {}).setdefault(address, {})
         if miner_balance is not None:
-            content[pool_name]['balance'] = miner_balance
+            miner_content['balance'] = miner_balance
         if miner_payment:
-            content[pool_name]['payment'] = miner_payment
-        with open(self.filename, 'w') as fd:
-            json.dump(content, fd, indent=2, separators=(',', ': '))
+            miner_content['payment'] = miner_payment
+        if miner_earnings:
+            miner_content['earnings'] = miner_earnings
+        if miner_workers is not None:
+            miner_content['workers'] = miner_workers
+        if save:
+            self.save()
+
+    def pop_miner(self, pool_name, address, save=True):
+        """Remove the state of a miner and return it"""
+        miner_content = self.read().get(pool_name, {}).get('miners', {}).pop(address, None)
+        if miner_content is not None and save:
+            self.save()
+        return miner_content
 
     def get(self, key):
         content = self.read()
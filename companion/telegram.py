@@ -22,8 +22,10 @@ class TelegramNotifier:
             text = text.replace(special_char, fr'\{special_char}')
         return text
 
-    def _generate_payload(self, message_variables, template_name):
+    def _generate_payload(self, message_variables, template_name, chat_id=None):
         payload = copy(self._default_payload)
+        if chat_id:
+            payload['chat_id'] = chat_id
         template_path = os.path.join(absolute_path, 'templates')
         loader = FileSystemLoader(template_path)
         env = Environment(loader=loader)
@@ -35,22 +37,38 @@ class TelegramNotifier:
         payload['text'] = text
         return payload
 
-    def notify_block(self, pool, number, hash, reward, time, round_time, luck, reward_fiat=None):
+    def notify_block(self, pool, number, hash, reward, time, round_time, luck, reward_fiat=None, luck_average=None,
+                     luck_ewma=None, round_time_average=None, unlucky_streak=None, chat_id=None):
         message_variables = {'pool': pool, 'number': number, 'hash': hash, 'reward': reward, 'time': time,
-                             'round_time': round_time, 'luck': luck, 'reward_fiat': reward_fiat}
-        payload = self._generate_payload(message_variables, 'block.md.j2')
+                             'round_time': round_time, 'luck': luck, 'reward_fiat': reward_fiat,
+                             'luck_average': luck_average, 'luck_ewma': luck_ewma,
+                             'round_time_average': round_time_average, 'unlucky_streak': unlucky_streak}
+        payload = self._generate_payload(message_variables, 'block.md.j2', chat_id=chat_id)
         self._send_message(payload)
 
-    def notify_balance(self, pool, address, url, balance, balance_percentage, balance_fiat=None):
+    def notify_block_anomaly(self, pool, number, hash, reasons, chat_id=None):
+        message_variables = {'pool': pool, 'number': number, 'hash': hash, 'reasons': reasons}
+        payload = self._generate_payload(message_variables, 'block_anomaly.md.j2', chat_id=chat_id)
+        self._send_message(payload)
+
+    def notify_balance(self, pool, address, url, balance, balance_percentage, balance_fiat=None, payout_eta=None,
+                       chat_id=None):
         message_variables = {'pool': pool, 'address': address, 'url': url, 'balance': balance,
-                             'balance_percentage': balance_percentage, 'balance_fiat': balance_fiat}
-        payload = self._generate_payload(message_variables, 'balance.md.j2')
+                             'balance_percentage': balance_percentage, 'balance_fiat': balance_fiat,
+                             'payout_eta': payout_eta}
+        payload = self._generate_payload(message_variables, 'balance.md.j2', chat_id=chat_id)
         self._send_message(payload)
 
-    def notify_payment(self, pool, address, txid, amount, time, duration, amount_fiat=None):
+    def notify_payment(self, pool, address, txid, amount, time, duration, amount_fiat=None, chat_id=None):
         message_variables = {'pool': pool, 'address': address, 'txid': txid, 'amount': amount,
                              'amount_fiat': amount_fiat, 'time': time, 'duration': duration}
-        payload = self._generate_payload(message_variables, 'payment.md.j2')
+        payload = self._generate_payload(message_variables, 'payment.md.j2', chat_id=chat_id)
+        self._send_message(payload)
+
+    def notify_workers(self, pool, address, url, offline_workers=None, slow_workers=None, chat_id=None):
+        message_variables = {'pool': pool, 'address': address, 'url': url, 'offline_workers': offline_workers,
+                             'slow_workers': slow_workers}
+        payload = self._generate_payload(message_variables, 'workers.md.j2', chat_id=chat_id)
         self._send_message(payload)
 
     def _send_message(self, payload):
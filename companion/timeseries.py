@@ -0,0 +1,121 @@
+import logging
+import mmap
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# (step in seconds, rows): one minute for a day, one hour for a month, one day for five years
+ARCHIVES = [(60, 24 * 60), (3600, 31 * 24), (86400, 5 * 365)]
+# each row holds the bucket timestamp, the average value and the number of values
+ROW_SIZE = 3
+DOUBLE_SIZE = 8
+# series kept mapped between updates, each one holds a file descriptor
+MAX_OPEN_SERIES = 64
+
+
+class RoundRobinSeries:
+    """Fixed-size file of ring buffers at several resolutions, mapped in memory
+
+    An update writes one row per resolution. Reads access the mapped file directly without parsing it.
+    """
+
+    def __init__(self, filename, archives=ARCHIVES):
+        self.filename = filename
+        self.archives = archives
+        self.offsets = []
+        offset = 0
+        for _, rows in archives:
+            self.offsets.append(offset)
+            offset += rows * ROW_SIZE
+        size = offset * DOUBLE_SIZE
+        if not os.path.isfile(filename) or os.path.getsize(filename) != size:
+            logger.debug(f'creating {filename}')
+            with open(filename, 'wb') as fd:
+                fd.truncate(size)
+        with open(filename, 'r+b') as fd:
+            # the mapping keeps its own file descriptor
+            self.mmap = mmap.mmap(fd.fileno(), size)
+        self.values = memoryview(self.mmap).cast('d')
+
+    def update(self, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        for (step, rows), offset in zip(self.archives, self.offsets):
+            bucket = int(timestamp // step) * step
+            row = offset + (bucket // step % rows) * ROW_SIZE
+            if bucket < self.values[row]:
+                # older than the ring buffer, the row holds a more recent bucket
+                continue
+            if self.values[row] != bucket:
+                # row of a previous lap
+                self.values[row] = bucket
+                self.values[row + 1] = value
+                self.values[row + 2] = 1
+            else:
+                count = self.values[row + 2] + 1
+                self.values[row + 1] += (value - self.values[row + 1]) / count
+                self.values[row + 2] = count
+
+    def fetch(self, start, end=None, step=None):
+        """Return (timestamp, value) tuples between start and end from the finest archive covering the period"""
+        now = time.time()
+        if end is None:
+            end = now
+        archives = list(zip(self.archives, self.offsets))
+        (archive_step, rows), offset = archives[-1]
+        for (candidate_step, candidate_rows), candidate_offset in archives:
+            if (step is None or candidate_step >= step) and now - start <= candidate_step * candidate_rows:
+                (archive_step, rows), offset = (candidate_step, candidate_rows), candidate_offset
+                break
+        series = []
+        first_bucket = max(int(start // archive_step), int(end // archive_step) - rows + 1)
+        for bucket in range(first_bucket, int(end // archive_step) + 1):
+            row = offset + (bucket % rows) * ROW_SIZE
+            if self.values[row] == bucket * archive_step:
+                series.append((bucket * archive_step, self.values[row + 1]))
+        return series
+
+    def close(self):
+        self.values.release()
+        self.mmap.flush()
+        self.mmap.close()
+
+
+class TimeSeriesStore:
+    """Directory of round robin series, one file per series
+
+    Only the most recently used series are kept open, to watch more miners than the limit of open files.
+    """
+
+    def __init__(self, directory, archives=ARCHIVES, max_open_series=MAX_OPEN_SERIES):
+        self.directory = directory
+        self.archives = archives
+        self.max_open_series = max_open_series
+        self.series = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, name):
+        if name in self.series:
+            self.series.move_to_end(name)
+            return self.series[name]
+        while len(self.series) >= self.max_open_series:
+            _, series = self.series.popitem(last=False)
+            series.close()
+        self.series[name] = RoundRobinSeries(filename=os.path.join(self.directory, f'{name}.rrd'),
+                                             archives=self.archives)
+        return self.series[name]
+
+    def update(self, name, value, timestamp=None):
+        self.get(name).update(value=value, timestamp=timestamp)
+
+    def fetch(self, name, start, end=None, step=None):
+        if not os.path.isfile(os.path.join(self.directory, f'{name}.rrd')):
+            return []
+        return self.get(name).fetch(start=start, end=end, step=step)
+
+    def close(self):
+        for series in self.series.values():
+            series.close()
+        self.series = OrderedDict()
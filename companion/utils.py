@@ -13,3 +13,7 @@ def convert_fiat(amount, exchange_rate, currency):
     converted = round(convert_weis(amount)*exchange_rate, 2)
     converted = f'{converted} {currency}'
     return converted
+
+
+def format_hashrate(hashrate, precision=2):
+    return f'{round(hashrate / 10**6, precision)} MH/s'
@@ -0,0 +1,48 @@
+import pytest
+from companion.earnings import EarningsEstimator
+
+
+class TestEarningsEstimator:
+    def test_rate(self):
+        estimator = EarningsEstimator()
+        for timestamp in range(0, 1000, 100):
+            estimator.add(timestamp=timestamp, balance=timestamp * 2)
+        assert estimator.rate == pytest.approx(2)
+
+    def test_rate_after_payout(self):
+        estimator = EarningsEstimator()
+        for timestamp in range(0, 1000, 100):
+            estimator.add(timestamp=timestamp, balance=timestamp * 2)
+        # payout resets the balance, previous rate is kept for the first sample
+        estimator.add(timestamp=1000, balance=0)
+        assert estimator.rate == pytest.approx(2)
+        estimator.add(timestamp=1100, balance=300)
+        assert estimator.rate == pytest.approx(3)
+
+    def test_ignore_old_samples(self):
+        estimator = EarningsEstimator()
+        estimator.add(timestamp=100, balance=100)
+        estimator.add(timestamp=100, balance=200)
+        assert estimator.count == 1
+
+    def test_estimate(self):
+        estimator = EarningsEstimator()
+        estimator.add(timestamp=0, balance=0)
+        estimator.add(timestamp=100, balance=100)
+        assert estimator.estimate(balance=100, payout_threshold=1000, now=100) == pytest.approx(1000)
+        # threshold reached 1000 seconds ago
+        assert estimator.estimate(balance=2000, payout_threshold=1000, now=100) == pytest.approx(-900)
+
+    def test_estimate_without_rate(self):
+        estimator = EarningsEstimator()
+        estimator.add(timestamp=0, balance=0)
+        assert estimator.estimate(balance=0, payout_threshold=1000, now=0) is None
+
+    def test_restore(self):
+        estimator = EarningsEstimator()
+        estimator.add(timestamp=0, balance=0)
+        estimator.add(timestamp=100, balance=100)
+        restored = EarningsEstimator(**estimator.to_dict())
+        restored.add(timestamp=200, balance=200)
+        assert restored.rate == pytest.approx(1)
+        assert restored.count == 3
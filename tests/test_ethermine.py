@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+pytest.importorskip('ethermine')
+from companion.pools.ethermine import WORKER_OFFLINE_PERIOD, EthermineHandler  # noqa: E402
+
+
+class TestEthermineHandler:
+    def test_get_workers(self, mocker):
+        now = time.time()
+        miner_workers = mocker.patch('companion.pools.ethermine.eth.miner_workers')
+        miner_workers.return_value = [
+            {'worker': 'w1', 'lastSeen': now - 60, 'reportedHashrate': 100, 'currentHashrate': 90,
+             'validShares': 10, 'staleShares': 1},
+            {'worker': 'w2', 'lastSeen': now - WORKER_OFFLINE_PERIOD - 60, 'reportedHashrate': 0,
+             'currentHashrate': 0, 'validShares': 0, 'staleShares': 0},
+        ]
+        workers = EthermineHandler.get_workers('0x0000000000000000000000000000000000000000')
+        miner_workers.assert_called_once_with('0x0000000000000000000000000000000000000000')
+        assert [(worker.name, worker.online) for worker in workers] == [('w1', True), ('w2', False)]
+        assert workers[0].to_dict() == {'online': True, 'reported_hashrate': 100, 'effective_hashrate': 90,
+                                        'valid_shares': 10, 'stale_shares': 1}
+
+    def test_watch_workers_offline(self, mocker):
+        notifier = mocker.Mock()
+        notifier.notify_workers = mocker.Mock()
+        handler = EthermineHandler(notifier=notifier)
+        mocker.patch('companion.pools.ethermine.eth.miner_workers').return_value = [
+            {'worker': 'w1', 'lastSeen': time.time() - WORKER_OFFLINE_PERIOD - 60, 'reportedHashrate': 0,
+             'currentHashrate': 0, 'validShares': 0, 'staleShares': 0}]
+        last_workers = {'w1': {'online': True, 'reported_hashrate': 100, 'effective_hashrate': 100,
+                               'valid_shares': 1, 'stale_shares': 0}}
+        workers = handler.watch_workers(address='0x0', last_workers=last_workers)
+        assert workers['w1']['online'] is False
+        notifier.notify_workers.assert_called_once()
+        assert notifier.notify_workers.call_args.kwargs['offline_workers'] == 'w1'
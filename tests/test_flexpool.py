@@ -1,6 +1,9 @@
+import os
 from datetime import datetime, timedelta
 
 import pytest
+from companion.outbox import Outbox
+from companion.pools import Worker
 from companion.pools.flexpool import FlexpoolHandler, Transaction
 from flexpoolapi.shared import Block as BlockApi
 
@@ -34,6 +37,40 @@ class TestFlexpoolHandler:
         else:
             notifier.notify_balance.assert_not_called()
 
+    def test_balance_with_outbox(self, mocker):
+        """Notifications should be added to the outbox instead of being sent"""
+        notifier = mocker.Mock()
+        outbox = mocker.Mock()
+        handler = FlexpoolHandler(notifier=notifier, outbox=outbox)
+        miner = mocker.patch('flexpoolapi.miner')
+        miner().balance.return_value = 2
+        mocker.patch('companion.pools.flexpool.FlexpoolHandler._watch_miner_payments')
+        mocker.patch('companion.pools.flexpool.Miner.get_payements')
+        handler.watch_miner(address='addr', last_balance=1)
+        outbox.add.assert_called_once()
+        assert outbox.add.call_args.kwargs['key'] == 'flexpool:balance:addr:1:2'
+        notifier.notify_balance.assert_not_called()
+
+    def test_balance_with_outbox_repeated_balance(self, mocker):
+        """A balance coming back to a previous value after a payment should be notified again"""
+        filename = 'test_flexpool_outbox.jsonl'
+        notifier = mocker.Mock()
+        outbox = Outbox(filename)
+        handler = FlexpoolHandler(notifier=notifier, outbox=outbox)
+        miner = mocker.patch('flexpoolapi.miner')
+        miner().details().min_payout_threshold = 100
+        mocker.patch('companion.pools.flexpool.FlexpoolHandler._watch_miner_payments')
+        mocker.patch('companion.pools.flexpool.Miner.get_payements')
+        last_balance = None
+        try:
+            for balance in [0, 50, 0]:
+                miner().balance.return_value = balance
+                last_balance, _ = handler.watch_miner(address='addr', last_balance=last_balance)
+                outbox.deliver(notifier)
+        finally:
+            os.unlink(filename)
+        assert notifier.notify_balance.call_count == 3
+
     def test_balance_with_api_failure(self, mocker):
         """An API failure should not send a balance notification"""
         notifier = mocker.Mock()
@@ -130,6 +167,32 @@ class TestFlexpoolHandler:
         else:
             notifier.notify_block.assert_not_called()
 
+    def test_block_statistics(self, mocker):
+        """New blocks should update statistics and send the rolling figures"""
+        notifier = mocker.Mock()
+        handler = FlexpoolHandler(notifier=notifier)
+        last_blocks = mocker.patch('flexpoolapi.pool.last_blocks')
+        last_blocks.return_value = self._create_blocks(range(1, 11))
+        handler.watch_blocks(last_block=None)
+        assert len(handler.block_statistics.luck) == 10
+        assert notifier.notify_block.call_args.kwargs['luck_average'] == '100%'
+
+    def test_block_with_rules(self, mocker):
+        """Rules should filter and route block notifications"""
+        notifier = mocker.Mock()
+        rules = mocker.Mock()
+        rules.evaluate.return_value = (True, 456)
+        handler = FlexpoolHandler(notifier=notifier, rules=rules)
+        last_blocks = mocker.patch('flexpoolapi.pool.last_blocks')
+        last_blocks.return_value = self._create_blocks([1, 2])
+        handler.watch_blocks(last_block=1)
+        assert rules.evaluate.call_args.kwargs['event']['luck'] == 1.0
+        assert notifier.notify_block.call_args.kwargs['chat_id'] == 456
+        rules.evaluate.return_value = (False, None)
+        notifier.reset_mock()
+        handler.watch_blocks(last_block=1)
+        notifier.notify_block.assert_not_called()
+
     def test_block_with_api_failure(self, mocker):
         """An API failure should not send a block notification"""
         notifier = mocker.Mock()
@@ -140,3 +203,60 @@ class TestFlexpoolHandler:
         block = handler.watch_blocks(last_block=1)
         assert block is None
         notifier.notify_block.assert_not_called()
+
+    def test_transaction_with_historical_rate(self, mocker):
+        """A payment should be converted with the exchange rate at the payment time"""
+        rates = mocker.Mock()
+        rates.get.return_value = 2000
+        time = datetime.now()
+        transaction = Transaction(txid='trx', amount=10**18, time=time, duration=timedelta(minutes=1),
+                                  exchange_rate=1000, currency='USD', rates=rates)
+        rates.get.assert_called_once_with(time)
+        assert transaction.amount_fiat == '2000.0 USD'
+
+    @staticmethod
+    def _create_workers(workers):
+        return [Worker(name=name, online=online, reported_hashrate=hashrate, effective_hashrate=hashrate,
+                       valid_shares=1, stale_shares=0) for name, online, hashrate in workers]
+
+    @pytest.mark.parametrize(
+        'last_workers,remote_workers,offline_workers,slow_workers',
+        [
+            pytest.param(None, [('w1', False, 0)], None, None, id='very_new_workers_without_notification'),
+            pytest.param([('w1', True, 100)], [('w1', True, 100)], None, None, id='same_workers_without_notification'),
+            pytest.param([('w1', True, 100), ('w2', True, 100)], [('w1', False, 0), ('w2', False, 0)], 'w1, w2', None,
+                         id='offline_workers_with_notification'),
+            pytest.param([('w1', True, 100)], [], 'w1', None, id='removed_worker_with_notification'),
+            pytest.param([('w1', False, 0)], [('w1', False, 0)], None, None,
+                         id='still_offline_worker_without_notification'),
+            pytest.param([('w1', True, 100)], [('w1', True, 10)], None, 'w1 (0.0 MH/s)',
+                         id='slow_worker_with_notification'),
+            pytest.param([('w1', True, 10)], [('w1', True, 10)], None, None,
+                         id='still_slow_worker_without_notification'),
+        ]
+    )
+    def test_workers(self, mocker, last_workers, remote_workers, offline_workers, slow_workers):
+        notifier = mocker.Mock()
+        handler = FlexpoolHandler(notifier=notifier, min_worker_hashrate=50)
+        get_workers = mocker.patch('companion.pools.flexpool.FlexpoolHandler.get_workers')
+        get_workers.return_value = self._create_workers(remote_workers)
+        if last_workers is not None:
+            last_workers = {w.name: w.to_dict() for w in self._create_workers(last_workers)}
+        workers = handler.watch_workers(address='addr', last_workers=last_workers)
+        assert list(workers) == [name for name, _, _ in remote_workers]
+        if offline_workers or slow_workers:
+            notifier.notify_workers.assert_called_once()
+            assert notifier.notify_workers.call_args.kwargs['offline_workers'] == offline_workers
+            assert notifier.notify_workers.call_args.kwargs['slow_workers'] == slow_workers
+        else:
+            notifier.notify_workers.assert_not_called()
+
+    def test_workers_with_api_failure(self, mocker):
+        """An API failure should not send a workers notification"""
+        notifier = mocker.Mock()
+        handler = FlexpoolHandler(notifier=notifier)
+        request_get = mocker.patch('requests.get')
+        request_get.return_value.status_code = 503
+        workers = handler.watch_workers(address='0000000000000000000000000000000000000001', last_workers={})
+        assert workers is None
+        notifier.notify_workers.assert_not_called()
@@ -0,0 +1,167 @@
+import json
+import os
+
+import companion.main as main_module
+import pytest
+from companion.earnings import EarningsEstimator
+from companion.main import main, move_miner_states, move_orphaned_outboxes, parse_arguments, run
+from companion.outbox import Outbox
+from companion.sharding import HashRing
+from companion.state import State
+from requests.exceptions import ConnectionError
+
+ADDRESSES = [f'0x{i:040x}' for i in range(20)]
+
+METRICS = {'miners': 1, 'notifications': 0, 'duration': 0, 'payout_etas': [], 'rules': {}}
+
+
+class StopLoop(Exception):
+    pass
+
+
+class TestMain:
+    @pytest.fixture(scope='function')
+    def config(self, mocker, tmp_path):
+        config = {'miner': '0x0', 'pools': [], 'state_file': str(tmp_path / 'state.json')}
+        mocker.patch('companion.main.read_config', return_value=config)
+        mocker.patch('companion.main.validate_config')
+
+    def test_interval_survives_cycle_error(self, config, mocker):
+        mocker.patch('sys.argv', ['main.py', '--interval', '60'])
+        run_shard = mocker.patch('companion.main.run_shard', side_effect=[ConnectionError(), METRICS])
+        sleep = mocker.patch('companion.main.time.sleep', side_effect=[None, StopLoop()])
+        with pytest.raises(StopLoop):
+            main()
+        assert run_shard.call_count == 2
+        assert sleep.call_count == 2
+
+    def test_single_cycle_raises_error(self, config, mocker):
+        mocker.patch('sys.argv', ['main.py'])
+        mocker.patch('companion.main.run_shard', side_effect=ConnectionError())
+        with pytest.raises(ConnectionError):
+            main()
+
+    def test_profile_every_must_be_positive(self, mocker):
+        mocker.patch('sys.argv', ['main.py', '--profile', 'profile.txt', '--profile-every', '0'])
+        with pytest.raises(SystemExit):
+            parse_arguments()
+
+    @pytest.mark.parametrize(
+        'arguments',
+        [
+            pytest.param(['--interval', '-5'], id='negative_interval'),
+            pytest.param(['--interval', '0'], id='zero_interval'),
+            pytest.param(['--shards', '0'], id='zero_shards'),
+            pytest.param(['--shards', '-1'], id='negative_shards'),
+            pytest.param(['--shards', '2', '--shard-index', '2'], id='shard_index_out_of_range'),
+            pytest.param(['--shards', '2', '--profile', 'profile.txt'], id='profile_parallel_shards'),
+        ]
+    )
+    def test_invalid_arguments(self, mocker, arguments):
+        mocker.patch('sys.argv', ['main.py'] + arguments)
+        with pytest.raises(SystemExit):
+            parse_arguments()
+
+    def test_profile_independent_shard(self, mocker):
+        mocker.patch('sys.argv', ['main.py', '--shards', '2', '--shard-index', '1', '--profile', 'profile.txt'])
+        assert parse_arguments().profile_file == 'profile.txt'
+
+
+class TestMoveMinerStates:
+    @staticmethod
+    def _read(filename):
+        with open(filename, 'r') as fd:
+            return json.load(fd)
+
+    @staticmethod
+    def _write(filename, content):
+        with open(filename, 'w') as fd:
+            json.dump(content, fd)
+
+    def test_add_and_remove_shards(self, mocker, tmp_path):
+        filename = str(tmp_path / 'state.json')
+        config = {'state_file': filename, 'pools': ['flexpool'], 'miners': ADDRESSES}
+        self._write(filename, {'flexpool': {'block': 1, 'miners': {address: {'balance': i}
+                                                                   for i, address in enumerate(ADDRESSES)}}})
+
+        save = mocker.spy(main_module.State, 'save')
+        move_miner_states(config=config, shard_indexes=range(2), shards=2)
+        # each changed file is written once
+        assert save.call_count == 2
+        ring = HashRing(shards=2)
+        shard_miners = [self._read(filename)['flexpool']['miners'],
+                        self._read(str(tmp_path / 'state.1.json'))['flexpool']['miners']]
+        for i, address in enumerate(ADDRESSES):
+            assert shard_miners[ring.get_shard(address)][address] == {'balance': i}
+            assert address not in shard_miners[1 - ring.get_shard(address)]
+        assert shard_miners[1]  # some miners have moved
+        assert self._read(filename)['flexpool']['block'] == 1
+
+        move_miner_states(config=config, shard_indexes=[0], shards=1)
+        assert self._read(filename)['flexpool']['miners'] == {address: {'balance': i}
+                                                              for i, address in enumerate(ADDRESSES)}
+        assert self._read(str(tmp_path / 'state.1.json'))['flexpool']['miners'] == {}
+
+    def test_legacy_state(self, tmp_path):
+        filename = str(tmp_path / 'state.json')
+        ring = HashRing(shards=2)
+        address = [address for address in ADDRESSES if ring.get_shard(address) == 1][0]
+        config = {'state_file': filename, 'pools': ['flexpool'], 'miner': address}
+        estimator = EarningsEstimator()
+        estimator.add(timestamp=0, balance=0)
+        estimator.add(timestamp=100, balance=5)
+        earnings = json.loads(json.dumps(estimator.to_dict()))
+        self._write(filename, {'flexpool': {'block': 1, 'balance': 5, 'payment': 'trx',
+                                            'earnings': {address: earnings}}})
+        move_miner_states(config=config, shard_indexes=[1], shards=2)
+        miner_state = self._read(str(tmp_path / 'state.1.json'))['flexpool']['miners'][address]
+        assert miner_state == {'balance': 5, 'payment': 'trx', 'earnings': earnings}
+        # the moved state is loaded by the handler
+        assert EarningsEstimator(**miner_state['earnings']).rate == pytest.approx(0.05)
+
+
+class TestMoveOrphanedOutboxes:
+    def test_remove_shards(self, tmp_path):
+        filename = str(tmp_path / 'outbox.jsonl')
+        config = {'outbox_file': filename}
+        for shard_index in range(1, 3):
+            outbox = Outbox(str(tmp_path / f'outbox.{shard_index}.jsonl'))
+            outbox.add(key=f'k{shard_index}', method='block', arguments={})
+        move_orphaned_outboxes(config=config, shards=2)
+        # the second shard still exists
+        assert os.path.isfile(str(tmp_path / 'outbox.1.jsonl'))
+        assert not os.path.isfile(str(tmp_path / 'outbox.2.jsonl'))
+        assert list(Outbox(filename).pending) == ['k2']
+
+
+class TestRun:
+    def test_legacy_state(self, mocker, tmp_path):
+        """State written before multiple miners support should be used for the configured miner"""
+        filename = str(tmp_path / 'state.json')
+        with open(filename, 'w') as fd:
+            json.dump({'flexpool': {'block': 1, 'balance': 5, 'payment': 'trx'}}, fd)
+        handler = mocker.patch('pools.flexpool.FlexpoolHandler').return_value
+        handler.watch_blocks.return_value = None
+        handler.watch_miner.return_value = (None, None)
+        handler.earnings = {}
+        metrics = run(config={'miner': 'addr', 'pools': ['flexpool']}, state=State(filename=filename))
+        handler.watch_miner.assert_called_once_with(address='addr', last_balance=5, last_transaction='trx')
+        assert metrics['miners'] == 1
+
+    def test_save_once_per_pool(self, mocker, tmp_path):
+        """The state file should be written once for all miners of a pool"""
+        filename = str(tmp_path / 'state.json')
+        handler = mocker.patch('pools.flexpool.FlexpoolHandler').return_value
+        handler.watch_blocks.return_value = 2
+        handler.block_statistics.to_dict.return_value = {}
+        handler.watch_miner.return_value = (10, 'trx')
+        handler.earnings = {}
+        state = State(filename=filename)
+        save = mocker.spy(state, 'save')
+        run(config={'miners': ADDRESSES, 'pools': ['flexpool']}, state=state)
+        save.assert_called_once()
+        with open(filename, 'r') as fd:
+            content = json.load(fd)
+        assert content['flexpool']['block'] == 2
+        assert all(content['flexpool']['miners'][address] == {'balance': 10, 'payment': 'trx'}
+                   for address in ADDRESSES)
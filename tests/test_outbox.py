@@ -0,0 +1,98 @@
+import os
+from datetime import datetime
+
+import pytest
+from companion.outbox import MAX_ATTEMPTS, Outbox
+
+
+class TestOutbox:
+    FILENAME = 'test_outbox.jsonl'
+
+    @pytest.fixture(scope='function')
+    def outbox(self):
+        yield Outbox(self.FILENAME)
+        if os.path.isfile(self.FILENAME):
+            os.unlink(self.FILENAME)
+
+    def test_deliver(self, mocker, outbox):
+        notifier = mocker.Mock()
+        outbox.add(key='k1', method='payment', arguments={'txid': 'trx1', 'time': datetime(2021, 1, 1)})
+        assert outbox.deliver(notifier) == 1
+        notifier.notify_payment.assert_called_once_with(txid='trx1', time='2021-01-01 00:00:00')
+        assert not outbox.pending
+
+    def test_deduplicate(self, mocker, outbox):
+        notifier = mocker.Mock()
+        assert outbox.add(key='k1', method='payment', arguments={})
+        assert not outbox.add(key='k1', method='payment', arguments={})
+        outbox.deliver(notifier)
+        assert not outbox.add(key='k1', method='payment', arguments={})
+        notifier.notify_payment.assert_called_once()
+
+    def test_retry_after_restart(self, mocker, outbox):
+        notifier = mocker.Mock()
+        notifier.notify_block.side_effect = Exception('network failure')
+        outbox.add(key='k1', method='block', arguments={'number': 1})
+        outbox.add(key='k2', method='block', arguments={'number': 2})
+        assert outbox.deliver(notifier) == 0
+        assert notifier.notify_block.call_count == 2
+        notifier.notify_block.side_effect = None
+        restarted = Outbox(self.FILENAME)
+        assert list(restarted.pending) == ['k1', 'k2']
+        assert restarted.attempts == {'k1': 1, 'k2': 1}
+        assert restarted.deliver(notifier) == 2
+        assert Outbox(self.FILENAME).pending == {}
+
+    def test_failure_does_not_block_next_notifications(self, mocker, outbox):
+        notifier = mocker.Mock()
+        notifier.notify_block.side_effect = Exception('bad request')
+        outbox.add(key='k1', method='block', arguments={'number': 1})
+        outbox.add(key='k2', method='payment', arguments={'txid': 'trx1'})
+        assert outbox.deliver(notifier) == 1
+        notifier.notify_payment.assert_called_once_with(txid='trx1')
+        assert list(outbox.pending) == ['k1']
+
+    def test_drop_after_max_attempts(self, mocker, outbox):
+        notifier = mocker.Mock()
+        notifier.notify_block.side_effect = Exception('bad request')
+        outbox.add(key='k1', method='block', arguments={})
+        for _ in range(MAX_ATTEMPTS):
+            outbox.deliver(notifier)
+        assert not outbox.pending
+        assert 'k1' in outbox.delivered
+
+    def test_corrupted_record(self, mocker, outbox):
+        outbox.add(key='k1', method='block', arguments={})
+        with open(self.FILENAME, 'a') as fd:
+            fd.write('{"key": "k2", "meth')
+        assert list(Outbox(self.FILENAME).pending) == ['k1']
+
+    def test_append_after_corrupted_record(self, mocker, outbox):
+        outbox.add(key='k1', method='block', arguments={})
+        with open(self.FILENAME, 'a') as fd:
+            fd.write('{"key": "k2", "meth')
+        restarted = Outbox(self.FILENAME)
+        restarted.add(key='k3', method='block', arguments={})
+        assert list(Outbox(self.FILENAME).pending) == ['k1', 'k3']
+
+    def test_compact(self, mocker, outbox):
+        notifier = mocker.Mock()
+        outbox.add(key='k1', method='block', arguments={})
+        outbox.deliver(notifier)
+        outbox.add(key='k2', method='block', arguments={})
+        outbox.compact()
+        with open(self.FILENAME, 'r') as fd:
+            assert len(fd.readlines()) == 2
+        restarted = Outbox(self.FILENAME)
+        assert list(restarted.pending) == ['k2']
+        assert list(restarted.delivered) == ['k1']
+
+    def test_merge(self, mocker, outbox):
+        other_filename = 'test_outbox.1.jsonl'
+        other = Outbox(other_filename)
+        other.add(key='k1', method='block', arguments={'number': 1})
+        other.add(key='k2', method='block', arguments={'number': 2})
+        other.deliver(mocker.Mock(notify_block=mocker.Mock(side_effect=[None, Exception('network failure')])))
+        assert outbox.merge(other_filename) == 1
+        assert not os.path.isfile(other_filename)
+        assert list(Outbox(self.FILENAME).pending) == ['k2']
@@ -0,0 +1,31 @@
+from companion.profiling import CycleProfiler
+
+
+class TestCycleProfiler:
+    @staticmethod
+    def _cycle():
+        return [str(i) for i in range(1000)]
+
+    def test_disabled(self):
+        profiler = CycleProfiler()
+        with profiler.profile():
+            self._cycle()
+        assert not profiler.enabled
+
+    def test_profile(self, tmp_path):
+        cpu_file = tmp_path / 'cpu.txt'
+        memory_file = tmp_path / 'memory.txt'
+        profiler = CycleProfiler(cpu_file=str(cpu_file), memory_file=str(memory_file))
+        with profiler.profile():
+            self._cycle()
+        assert 'function calls' in cpu_file.read_text()
+        assert 'peak' in memory_file.read_text()
+
+    def test_sampling(self, tmp_path):
+        cpu_file = tmp_path / 'cpu.txt'
+        profiler = CycleProfiler(cpu_file=str(cpu_file), every=3)
+        for cycle in range(1, 5):
+            with profiler.profile():
+                self._cycle()
+            if cycle in [1, 4]:
+                assert cpu_file.read_text().startswith(f'cycle {cycle}\n')
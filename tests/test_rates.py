@@ -0,0 +1,64 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import pytest
+from companion.rates import REFRESH_PERIOD, RateCache
+from requests.exceptions import HTTPError
+
+
+class TestRateCache:
+    FILENAME = 'test_rates.json'
+    NOW = int(time.time())
+    PRICES = [(NOW - 7200, 100.0), (NOW - 3600, 200.0), (NOW, 300.0)]
+
+    @pytest.fixture(scope='function')
+    def remove_rates(self):
+        yield
+        if os.path.isfile(self.FILENAME):
+            os.unlink(self.FILENAME)
+
+    @pytest.fixture(scope='function')
+    def get_rate_range(self, mocker):
+        get_rate_range = mocker.patch('companion.rates.get_rate_range')
+        get_rate_range.return_value = self.PRICES
+        return get_rate_range
+
+    def test_interpolate(self, remove_rates, get_rate_range):
+        rates = RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD')
+        assert rates.get(self.NOW - 7200) == 100.0
+        assert rates.get(self.NOW - 5400) == 150.0
+        assert rates.get(datetime.fromtimestamp(self.NOW - 1800)) == 250.0
+
+    def test_warm_cache_without_network(self, remove_rates, get_rate_range):
+        rates = RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD')
+        for timestamp in range(self.NOW - 7200, self.NOW + REFRESH_PERIOD, 10):
+            rates.get(timestamp)
+        get_rate_range.assert_called_once()
+
+    def test_persistence(self, remove_rates, get_rate_range):
+        RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD').get(self.NOW)
+        with open(self.FILENAME, 'r') as fd:
+            assert 'ethereum/usd' in json.load(fd)
+        rates = RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD')
+        assert rates.get(self.NOW - 3600) == 200.0
+        get_rate_range.assert_called_once()
+
+    def test_extend_to_the_past(self, remove_rates, get_rate_range):
+        rates = RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD')
+        rates.get(self.NOW)
+        rates.get(rates.start - 1)
+        assert get_rate_range.call_count == 2
+
+    def test_api_failure(self, remove_rates, get_rate_range):
+        get_rate_range.side_effect = HTTPError()
+        rates = RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD')
+        assert rates.get(self.NOW) is None
+
+    def test_api_failure_not_retried(self, remove_rates, get_rate_range):
+        get_rate_range.side_effect = HTTPError()
+        rates = RateCache(filename=self.FILENAME, ids='ethereum', vs_currencies='USD')
+        for timestamp in [self.NOW, self.NOW - 3600, self.NOW - 7200]:
+            assert rates.get(timestamp) is None
+        get_rate_range.assert_called_once()
@@ -0,0 +1,65 @@
+from companion.rolling import MIN_SAMPLES, UNLUCKY_STREAK_THRESHOLD, BlockStatistics, RollingWindow
+
+
+class TestRollingWindow:
+    def test_push(self):
+        window = RollingWindow(size=3)
+        for value in [1, 2, 3, 4]:
+            window.push(value)
+        assert len(window) == 3
+        assert window.mean == 3
+        assert window.sorted_values == [2, 3, 4]
+        assert window.to_dict()['values'] == [2, 3, 4]
+
+    def test_ewma(self):
+        window = RollingWindow(alpha=0.5)
+        window.push(2)
+        window.push(4)
+        assert window.ewma == 3
+
+    def test_percentile(self):
+        window = RollingWindow(values=list(range(100)))
+        assert window.percentile(0) == 0
+        assert window.percentile(95) == 95
+        assert window.percentile(100) == 99
+
+    def test_empty(self):
+        window = RollingWindow()
+        assert window.mean is None
+        assert window.percentile(50) is None
+
+    def test_restore(self):
+        window = RollingWindow(size=3)
+        for value in [1, 2, 3, 4, 5]:
+            window.push(value)
+        restored = RollingWindow(size=3, **window.to_dict())
+        assert restored.to_dict() == window.to_dict()
+        assert restored.mean == window.mean
+
+
+class TestBlockStatistics:
+    def test_streaks(self):
+        statistics = BlockStatistics()
+        statistics.add(luck=0.5, round_time=60)
+        assert statistics.lucky_streak == 1
+        statistics.add(luck=1.5, round_time=60)
+        assert statistics.lucky_streak == 0
+        assert statistics.unlucky_streak == 1
+
+    def test_unlucky_streak_anomaly(self):
+        statistics = BlockStatistics()
+        for _ in range(UNLUCKY_STREAK_THRESHOLD - 1):
+            assert statistics.add(luck=1.5, round_time=60) == []
+        assert statistics.add(luck=1.5, round_time=60) == [f'{UNLUCKY_STREAK_THRESHOLD} unlucky blocks in a row']
+
+    def test_round_time_anomaly(self):
+        statistics = BlockStatistics()
+        for _ in range(MIN_SAMPLES):
+            statistics.add(luck=0.5, round_time=60)
+        assert statistics.add(luck=0.5, round_time=600) == ['round time above the 95th percentile']
+
+    def test_restore(self):
+        statistics = BlockStatistics()
+        statistics.add(luck=1.5, round_time=60)
+        restored = BlockStatistics(**statistics.to_dict())
+        assert restored.to_dict() == statistics.to_dict()
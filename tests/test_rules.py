@@ -0,0 +1,84 @@
+import pytest
+from companion.config import validate_config
+from companion.rules import InvalidConfigException, RuleEngine
+from jsonschema.exceptions import ValidationError
+
+RULES = [
+    {'name': 'lucky', 'event': 'block', 'conditions': [{'field': 'luck', 'operator': '<', 'value': 0.5}],
+     'chat_id': 456},
+    {'name': 'big', 'event': 'block', 'conditions': [{'field': 'reward', 'operator': '>', 'value': 2}]},
+    {'name': 'steps', 'event': 'balance',
+     'conditions': [{'field': 'balance_percentage', 'operator': 'crosses', 'value': 10}]},
+    {'name': 'silent', 'event': 'workers', 'action': 'drop'},
+]
+
+
+class TestRuleEngine:
+    @pytest.fixture(scope='function')
+    def rules(self):
+        return RuleEngine(RULES)
+
+    @pytest.mark.parametrize(
+        'method,event,expected',
+        [
+            pytest.param('block', {'luck': 0.4, 'reward': 1}, (True, 456), id='routed_block'),
+            pytest.param('block', {'luck': 0.8, 'reward': 3}, (True, None), id='big_block'),
+            pytest.param('block', {'luck': 0.8, 'reward': 1}, (False, None), id='block_without_match'),
+            pytest.param('block', {}, (False, None), id='block_without_fields'),
+            pytest.param('balance', {'balance_percentage': 21, 'previous_balance_percentage': 19}, (True, None),
+                         id='balance_crossing_step'),
+            pytest.param('balance', {'balance_percentage': 25, 'previous_balance_percentage': 21}, (False, None),
+                         id='balance_within_step'),
+            pytest.param('balance', {'balance_percentage': 5, 'previous_balance_percentage': None}, (True, None),
+                         id='very_new_balance'),
+            pytest.param('workers', {'offline_workers': 1}, (False, None), id='dropped_workers'),
+            pytest.param('payment', {'amount': 1}, (True, None), id='payment_without_rules'),
+        ]
+    )
+    def test_evaluate(self, rules, method, event, expected):
+        assert rules.evaluate(method=method, event=event) == expected
+
+    def test_counters(self, rules):
+        rules.evaluate(method='block', event={'luck': 0.4, 'reward': 3})
+        rules.evaluate(method='block', event={'luck': 0.8, 'reward': 3})
+        assert rules.counters() == {'lucky': 1, 'big': 1, 'steps': 0, 'silent': 0}
+        rules.reset_counters()
+        assert rules.counters() == {'lucky': 0, 'big': 0, 'steps': 0, 'silent': 0}
+
+    def test_default_name(self):
+        assert list(RuleEngine([{'event': 'block'}]).counters()) == ['rule 0']
+
+    def test_invalid_step(self):
+        with pytest.raises(InvalidConfigException):
+            RuleEngine([{'event': 'balance', 'conditions': [{'field': 'balance', 'operator': 'crosses', 'value': 0}]}])
+
+    def test_duplicate_name(self):
+        with pytest.raises(InvalidConfigException):
+            RuleEngine([{'name': 'rule', 'event': 'block'}, {'name': 'rule', 'event': 'balance'}])
+
+    @pytest.mark.parametrize(
+        'rule',
+        [
+            pytest.param({'event': 'block', 'condition': [{'field': 'luck', 'operator': '<', 'value': 1}]},
+                         id='unknown_rule_key'),
+            pytest.param({'event': 'block', 'conditions': [{'field': 'luck', 'operator': '<', 'value': 1, 'x': 1}]},
+                         id='unknown_condition_key'),
+        ]
+    )
+    def test_schema_rejects_unknown_keys(self, rule):
+        with pytest.raises(ValidationError):
+            validate_config({'rules': [rule]})
+
+    @pytest.mark.parametrize(
+        'rule',
+        [
+            pytest.param({'event': 'block', 'conditions': [{'field': 'luk', 'operator': '<', 'value': 1}]},
+                         id='unknown_field'),
+            pytest.param({'event': 'payment', 'conditions': [{'field': 'luck', 'operator': '<', 'value': 1}]},
+                         id='field_of_another_event'),
+            pytest.param({'event': 'unknown'}, id='unknown_event'),
+        ]
+    )
+    def test_invalid_rule(self, rule):
+        with pytest.raises(InvalidConfigException):
+            RuleEngine([rule])
@@ -0,0 +1,19 @@
+import pytest
+from companion.scheduler import PAYOUT_INTERVAL, PAYOUT_WINDOW, next_delay
+
+
+@pytest.mark.parametrize(
+    'payout_etas,expected_delay',
+    [
+        pytest.param(None, 3600, id='without_payout'),
+        pytest.param([10000 + PAYOUT_WINDOW * 10], 3600, id='far_payout'),
+        pytest.param([10000 + PAYOUT_WINDOW + 600], 600, id='wake_up_before_payout'),
+        pytest.param([10000 + 60], PAYOUT_INTERVAL, id='around_payout'),
+        pytest.param([10000 - PAYOUT_WINDOW * 10], 3600, id='late_payout'),
+        pytest.param([10000 - PAYOUT_WINDOW * 10, 10000 + PAYOUT_WINDOW + 600], 600,
+                     id='late_payout_with_next_payout'),
+        pytest.param([10000 + PAYOUT_WINDOW + 1200, 10000 + 60], PAYOUT_INTERVAL, id='several_payouts'),
+    ]
+)
+def test_next_delay(payout_etas, expected_delay):
+    assert next_delay(interval=3600, payout_etas=payout_etas, now=10000) == expected_delay
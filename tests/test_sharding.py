@@ -0,0 +1,55 @@
+import pytest
+from companion.sharding import HashRing, merge_metrics, shard_filename, shard_filenames
+
+ADDRESSES = [f'0x{i:040x}' for i in range(1000)]
+
+
+class TestHashRing:
+    def test_single_shard(self):
+        ring = HashRing(shards=1)
+        assert {ring.get_shard(address) for address in ADDRESSES} == {0}
+
+    def test_distribution(self):
+        ring = HashRing(shards=4)
+        counts = [0] * 4
+        for address in ADDRESSES:
+            counts[ring.get_shard(address)] += 1
+        assert min(counts) > len(ADDRESSES) / 4 / 2
+
+    def test_case_insensitive(self):
+        ring = HashRing(shards=4)
+        assert ring.get_shard('0xABCDEF') == ring.get_shard('0xabcdef')
+
+    def test_add_shard(self):
+        """Adding a shard should only move addresses to the new shard"""
+        ring, new_ring = HashRing(shards=4), HashRing(shards=5)
+        moved = [address for address in ADDRESSES if ring.get_shard(address) != new_ring.get_shard(address)]
+        assert all(new_ring.get_shard(address) == 4 for address in moved)
+        assert len(moved) < len(ADDRESSES) / 5 * 1.5
+
+
+@pytest.mark.parametrize(
+    'filename,shard_index,shards,expected',
+    [
+        pytest.param('state.json', 0, 1, 'state.json', id='without_shards'),
+        pytest.param('state.json', 1, 2, 'state.1.json', id='with_shards'),
+        pytest.param('state.json', 0, 2, 'state.json', id='first_shard'),
+        pytest.param('outbox', 1, 2, 'outbox.1', id='without_extension'),
+    ]
+)
+def test_shard_filename(filename, shard_index, shards, expected):
+    assert shard_filename(filename, shard_index, shards) == expected
+
+
+def test_shard_filenames(tmp_path):
+    for name in ['state.json', 'state.1.json', 'state.12.json', 'state.backup.json', 'other.1.json']:
+        (tmp_path / name).write_text('{}')
+    filename = str(tmp_path / 'state.json')
+    assert shard_filenames(filename) == [filename, str(tmp_path / 'state.1.json'), str(tmp_path / 'state.12.json')]
+
+
+def test_merge_metrics():
+    metrics = merge_metrics([{'miners': 2, 'notifications': 1, 'duration': 3, 'payout_etas': [], 'rules': {'r': 1}},
+                             {'miners': 3, 'notifications': 0, 'duration': 1, 'payout_etas': [10], 'rules': {'r': 2}}])
+    assert metrics == {'shards': 2, 'miners': 5, 'notifications': 1, 'duration': 3, 'payout_etas': [10],
+                       'rules': {'r': 3}}
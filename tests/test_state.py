@@ -91,6 +91,18 @@ class TestState:
         content = state.read()
         assert content[self.POOL_NAME]['payment'] == self.CONTENT[self.POOL_NAME]['payment']  # not changed
 
+    def test_write_block_statistics(self, create_state, state):
+        statistics = {'luck': {'values': [1.0], 'ewma': 1.0}, 'round_time': {'values': [60], 'ewma': 60}}
+        state.write(pool_name=self.POOL_NAME, block_statistics=statistics)
+        content = state.read()
+        assert content[self.POOL_NAME]['block_statistics'] == statistics
+
+    def test_write_miner(self, create_state, state):
+        state.write(pool_name=self.POOL_NAME, address='addr', miner_balance=5678, miner_payment='0x1111111')
+        content = state.read()
+        assert content[self.POOL_NAME]['miners']['addr'] == {'balance': 5678, 'payment': '0x1111111'}
+        assert content[self.POOL_NAME]['balance'] == self.CONTENT[self.POOL_NAME]['balance']  # not changed
+
     def test_get(self, create_state):
         state = State(filename=self.FILENAME)
         assert state.get(self.POOL_NAME) == self.CONTENT[self.POOL_NAME]
@@ -98,3 +110,15 @@ class TestState:
     def test_get_missing_key(self, create_state):
         state = State(filename=self.FILENAME)
         assert state.get('UNKNOWN_POOL') == {}
+
+    def test_pop_miner(self, create_state, state):
+        state.write(pool_name=self.POOL_NAME, address='addr', miner_balance=5678)
+        assert state.pop_miner(pool_name=self.POOL_NAME, address='addr') == {'balance': 5678}
+        assert state.read()[self.POOL_NAME]['miners'] == {}
+        assert state.pop_miner(pool_name=self.POOL_NAME, address='addr') is None
+
+    def test_write_without_save(self, create_state, state):
+        state.write(pool_name=self.POOL_NAME, address='addr', miner_balance=5678, save=False)
+        assert State(self.FILENAME).read() == self.CONTENT
+        state.save()
+        assert State(self.FILENAME).read()[self.POOL_NAME]['miners']['addr'] == {'balance': 5678}
@@ -0,0 +1,86 @@
+import os
+import resource
+import time
+
+import pytest
+from companion.timeseries import MAX_OPEN_SERIES, RoundRobinSeries, TimeSeriesStore
+
+ARCHIVES = [(60, 10), (3600, 10)]
+
+
+class TestRoundRobinSeries:
+    @pytest.fixture(scope='function')
+    def series(self, tmp_path):
+        series = RoundRobinSeries(filename=str(tmp_path / 'test.rrd'), archives=ARCHIVES)
+        yield series
+        series.close()
+
+    def test_size(self, series):
+        assert os.path.getsize(series.filename) == (10 + 10) * 3 * 8
+
+    def test_average(self, series):
+        now = int(time.time()) // 60 * 60
+        series.update(value=1, timestamp=now)
+        series.update(value=3, timestamp=now + 1)
+        assert series.fetch(start=now - 60) == [(now, 2)]
+
+    def test_resolutions(self, series):
+        now = int(time.time()) // 60 * 60
+        for minute in range(10):
+            series.update(value=minute, timestamp=now - 540 + minute * 60)
+        # the last minutes are read from the finest archive
+        assert series.fetch(start=now - 540) == [(now - 540 + minute * 60, minute) for minute in range(10)]
+        # the same values are averaged by hour in the coarser archive
+        hours = series.fetch(start=now - 540, step=3600)
+        assert hours and all(timestamp % 3600 == 0 for timestamp, _ in hours)
+        # older values are only kept in the coarser archive
+        assert series.fetch(start=now - 7200) == hours
+
+    def test_overwrite_previous_lap(self, series):
+        now = int(time.time()) // 60 * 60
+        series.update(value=1, timestamp=now - 600)
+        series.update(value=5, timestamp=now)
+        assert series.fetch(start=now - 540) == [(now, 5)]
+
+    def test_ignore_older_lap(self, series):
+        """An old value should not replace a more recent value of the same row"""
+        now = int(time.time()) // 60 * 60
+        series.update(value=1, timestamp=now)
+        series.update(value=9, timestamp=now - 86400)
+        assert series.fetch(start=now - 60) == [(now, 1)]
+        assert series.fetch(start=now - 60, step=3600) == [(now // 3600 * 3600, 1)]
+
+    def test_persistence(self, tmp_path):
+        now = int(time.time()) // 60 * 60
+        filename = str(tmp_path / 'test.rrd')
+        series = RoundRobinSeries(filename=filename, archives=ARCHIVES)
+        series.update(value=42, timestamp=now)
+        series.close()
+        series = RoundRobinSeries(filename=filename, archives=ARCHIVES)
+        assert series.fetch(start=now) == [(now, 42)]
+        series.close()
+
+
+class TestTimeSeriesStore:
+    def test_update(self, tmp_path):
+        now = int(time.time()) // 60 * 60
+        store = TimeSeriesStore(directory=str(tmp_path), archives=ARCHIVES)
+        store.update(name='flexpool.luck', value=0.5, timestamp=now)
+        assert store.fetch(name='flexpool.luck', start=now) == [(now, 0.5)]
+        assert store.fetch(name='unknown', start=now) == []
+        store.close()
+
+    def test_more_series_than_open_files(self, tmp_path):
+        soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(256, hard_limit), hard_limit))
+        now = int(time.time()) // 60 * 60
+        store = TimeSeriesStore(directory=str(tmp_path), archives=ARCHIVES)
+        try:
+            for index in range(600):
+                store.update(name=f'flexpool.{index}.balance', value=index, timestamp=now)
+            assert len(store.series) == MAX_OPEN_SERIES
+            # closed series are mapped again
+            assert store.fetch(name='flexpool.0.balance', start=now) == [(now, 0)]
+        finally:
+            store.close()
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))